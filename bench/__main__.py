@@ -0,0 +1,138 @@
+"""
+Benchmark แบบ offline: CTFtime จำลองบน localhost + Discord ปลอมที่จดข้อความที่ถูกส่ง
+
+    python -m bench                      # ทุก scenario, ผลเป็น JSON ทาง stdout
+    python -m bench search digest -o new.json --baseline old.json
+
+แต่ละ scenario รันใน process ใหม่พร้อมฐานข้อมูลชั่วคราวของตัวเอง ผลจึงเทียบกันข้ามรอบได้
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIO_NAMES = ["search", "digest", "reactions", "scheduler"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Offline CTFtimeBot benchmarks")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario", help=f"any of {', '.join(SCENARIO_NAMES)} (default: all)")
+    parser.add_argument("-o", "--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="compare against a previous JSON result")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--events", type=int, default=2000, help="synthetic events served by the mock CTFtime")
+    parser.add_argument("--searches", type=int, default=500)
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--reactions", type=int, default=5000)
+    parser.add_argument("--toggle-ratio", type=float, default=0.3, help="fraction of reactions that are removals")
+    parser.add_argument("--subscriptions", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--digest-concurrency", type=int, default=8)
+    parser.add_argument("--ctftime-latency", type=float, default=0.0, help="seconds added to each mock response")
+    parser.add_argument("--discord-latency", type=float, default=0.0, help="seconds added to each fake send")
+    parser.add_argument("--real-rate-limits", action="store_true", help="keep the dispatcher's Discord rate limits")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIO_NAMES]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+    return args
+
+
+def run_child(args):
+    # import หลังตั้ง CTFTIMEBOT_DB แล้วเท่านั้น storage จะได้เปิดไฟล์ชั่วคราว
+    from bench.scenarios import run_scenario
+
+    result = asyncio.run(run_scenario(args.child, args))
+    with open(args.child_output, "w") as f:
+        json.dump(result, f)
+
+
+def run_isolated(name, argv):
+    with tempfile.TemporaryDirectory(prefix="ctftimebot-bench-") as tmp:
+        output = os.path.join(tmp, "result.json")
+        env = dict(os.environ, CTFTIMEBOT_DB=os.path.join(tmp, "bench.db"))
+        completed = subprocess.run(
+            [sys.executable, "-m", "bench", *argv, "--child", name, "--child-output", output],
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        if completed.returncode != 0:
+            return {"error": f"exited with status {completed.returncode}"}
+        with open(output) as f:
+            return json.load(f)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(document, baseline):
+    results = document["results"]
+    lines = []
+    if baseline.get("meta", {}).get("params") != document["meta"]["params"]:
+        lines.append("warning: baseline was run with different parameters")
+    lines += [f"{'scenario':<12}{'ops/s':>12}{'baseline':>12}{'ratio':>8}{'p95 ms':>10}{'baseline':>10}"]
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "error" in result or "error" in before:
+            continue
+        ratio = result["ops_per_sec"] / before["ops_per_sec"] if before["ops_per_sec"] else float("nan")
+        lines.append(
+            f"{name:<12}{result['ops_per_sec']:>12}{before['ops_per_sec']:>12}{ratio:>8.2f}"
+            f"{result['latency_ms']['p95']:>10}{before['latency_ms']['p95']:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.child:
+        return run_child(args)
+
+    names = args.scenarios or SCENARIO_NAMES
+    option_argv = [arg for arg in argv if arg not in SCENARIO_NAMES]
+    results = {}
+    for name in names:
+        print(f"running {name}...", file=sys.stderr)
+        results[name] = run_isolated(name, option_argv)
+
+    params = {key: value for key, value in vars(args).items() if key not in ("scenarios", "output", "baseline", "child", "child_output")}
+    document = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": int(time.time()),
+            "params": params,
+        },
+        "results": results,
+    }
+
+    text = json.dumps(document, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(compare(document, json.load(f)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
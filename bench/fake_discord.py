@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+_snowflakes = itertools.count(10 ** 17)
+
+
+def snowflake():
+    return next(_snowflakes)
+
+
+APPLICATION_ID = snowflake()
+
+
+class Transport:
+    """
+    แทน HTTP ของ Discord: จดทุกข้อความที่ถูกส่ง และหน่วงเวลาต่อคำขอได้ตามต้องการ
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = []
+
+    async def send(self, destination, kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        message = FakeMessage(destination, kwargs)
+        self.sent.append(message)
+        return message
+
+    def reset(self):
+        self.sent = []
+
+
+class FakeMessage:
+    def __init__(self, channel, kwargs):
+        self.id = snowflake()
+        self.channel = channel
+        self.content = kwargs.get("content")
+        self.embeds = list(kwargs.get("embeds") or ([kwargs["embed"]] if kwargs.get("embed") else []))
+        self.view = kwargs.get("view")
+
+    async def edit(self, **kwargs):
+        self.view = kwargs.get("view", self.view)
+        return self
+
+
+class FakeChannel:
+    def __init__(self, transport, guild=None, channel_id=None):
+        self.id = channel_id or snowflake()
+        self.guild = guild
+        self._transport = transport
+
+    async def send(self, **kwargs):
+        return await self._transport.send(self, kwargs)
+
+
+class FakeWebhook(FakeChannel):
+    """
+    interaction.followup ของจริงเป็น Webhook ที่ id คือ application id ทุก interaction ใช้ id ร่วมกัน ต่างกันแค่ token
+    """
+
+    def __init__(self, transport):
+        super().__init__(transport, channel_id=APPLICATION_ID)
+        self.token = f"interaction-{snowflake()}"
+
+
+class FakeUser:
+    def __init__(self, transport, user_id=None, bot=False):
+        self.id = user_id or snowflake()
+        self.bot = bot
+        self.dm_channel = None
+        self._transport = transport
+
+    async def create_dm(self):
+        self.dm_channel = FakeChannel(self._transport)
+        return self.dm_channel
+
+
+class FakeGuild:
+    def __init__(self, guild_id=None):
+        self.id = guild_id or snowflake()
+        self.default_role = SimpleNamespace(id=self.id)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.deferred = False
+
+    async def defer(self, **kwargs):
+        self.deferred = True
+
+    def is_done(self):
+        return self.deferred
+
+
+class FakeInteraction:
+    """
+    Interaction พอให้เรียก callback ของ slash command ได้ ข้อความ followup ไปลง transport เดียวกัน
+    """
+
+    def __init__(self, transport, guild_id):
+        self.guild_id = guild_id
+        self.extras = {}
+        self.response = FakeResponse()
+        self.followup = FakeWebhook(transport)
+        self.command = None
+
+
+class FakeClient:
+    """
+    ส่วนของ discord.Client ที่ cog ในบอทเรียกใช้ ทุกการส่งไปลง Transport แทน Discord
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.user = FakeUser(transport, bot=True)
+        self.guilds = {}
+        self.channels = {}
+        self.users = {}
+
+    def add_guild(self):
+        guild = FakeGuild()
+        channel = FakeChannel(self.transport, guild=guild)
+        self.guilds[guild.id] = guild
+        self.channels[channel.id] = channel
+        return guild, channel
+
+    def add_user(self):
+        user = FakeUser(self.transport)
+        self.users[user.id] = user
+        return user
+
+    def get_guild(self, guild_id):
+        return self.guilds.get(guild_id)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    async def fetch_user(self, user_id):
+        return self.users[user_id]
+
+    async def wait_until_ready(self):
+        return None
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+import random
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+WORDS = [
+    "Alpha", "Bravo", "Cyber", "Pwn", "Hack", "Shell", "Crypto", "Byte", "Root", "Kernel",
+    "Ghost", "Nova", "Quantum", "Iron", "Red", "Blue", "Zero", "Day", "Stack", "Heap",
+]
+SUFFIXES = ["CTF", "Quals", "Finals", "Challenge", "Cup", "Games"]
+FORMATS = ["Jeopardy", "Attack-Defense", "Hack-quest"]
+RESTRICTIONS = ["Open", "Individual"]
+
+DAY = 24 * 60 * 60
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def make_events(count, now_ts, seed=0, horizon=90 * DAY):
+    """
+    สร้าง CTF ปลอมที่มี field เหมือนของ CTFtime กระจายวันเริ่มตลอด horizon ข้างหน้า
+    """
+    rng = random.Random(seed)
+    events = []
+    for ctf_id in range(1, count + 1):
+        start_ts = now_ts + rng.randint(60 * 60, horizon)
+        days = rng.randint(0, 2)
+        hours = rng.choice([0, 8, 12, 24, 36, 48]) if days == 0 else rng.randint(0, 23)
+        finish_ts = start_ts + days * DAY + max(hours, 1) * 60 * 60
+        title = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(SUFFIXES)} {2026 + ctf_id % 3}"
+        organizer = f"{rng.choice(WORDS)}{rng.choice(WORDS)} Team"
+        events.append({
+            "id": ctf_id,
+            "title": title,
+            "url": f"https://ctf{ctf_id}.example.org",
+            "ctftime_url": f"https://ctftime.org/event/{ctf_id}/",
+            "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))),
+            "start": _iso(start_ts),
+            "finish": _iso(finish_ts),
+            "duration": {"days": days, "hours": hours},
+            "format": rng.choice(FORMATS),
+            "onsite": rng.random() < 0.1,
+            "location": "",
+            "weight": round(rng.uniform(0, 100), 2),
+            "restrictions": rng.choice(RESTRICTIONS),
+            "participants": rng.randint(0, 1500),
+            "organizers": [{"id": 10000 + ctf_id, "name": organizer}],
+            "logo": "",
+        })
+    return events
+
+
+class MockCTFtime:
+    """
+    CTFtime API จำลองบน localhost ตอบ /events/ และ /events/{id}/ พร้อม ETag เหมือนของจริง
+    """
+
+    def __init__(self, events, latency=0.0):
+        self.events = {info["id"]: info for info in events}
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        self.port = None
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/api/v1"
+
+    async def _respond(self, request, data, status=200):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        body = json.dumps(data).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, status=status, content_type="application/json", headers={"ETag": etag})
+
+    async def list_events(self, request):
+        limit = int(request.query.get("limit", 100))
+        start = int(request.query.get("start", 0))
+        finish = int(request.query.get("finish", 2 ** 62))
+        matched = sorted(
+            (
+                info for info in self.events.values()
+                if start <= datetime.fromisoformat(info["start"]).timestamp() <= finish
+            ),
+            key=lambda info: (info["start"], info["id"]),
+        )
+        return await self._respond(request, matched[:limit])
+
+    async def get_event(self, request):
+        info = self.events.get(int(request.match_info["ctf_id"]))
+        if info is None:
+            return await self._respond(request, {"detail": "Not found."}, status=404)
+        return await self._respond(request, info)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/v1/events/", self.list_events)
+        app.router.add_get("/api/v1/events/{ctf_id}/", self.get_event)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
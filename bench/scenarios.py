@@ -0,0 +1,305 @@
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+from discord import app_commands
+
+import dispatcher as dispatcher_module
+from config import config_service
+from ctftime import ctftime
+from dispatcher import TokenBucket, dispatcher
+from embeds import create_ctf_embed, render_cache_info
+from messaging import NUMBER_EMOJIS, send_embeds
+from storage import storage
+from subscriptions import subscriptions
+from sync import event_store, sync_worker
+
+from bench.fake_discord import FakeClient, FakeInteraction, Transport
+from bench.mock_ctftime import DAY, MockCTFtime, make_events
+
+UNLIMITED_RATE = (10 ** 9, 1.0)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(latencies, seconds, **extra):
+    result = {
+        "ops": len(latencies),
+        "seconds": round(seconds, 6),
+        "ops_per_sec": round(len(latencies) / seconds, 2) if seconds else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(max(latencies, default=0.0) * 1000, 3),
+        },
+    }
+    result.update(extra)
+    return result
+
+
+async def drive(operation, count, concurrency=1):
+    """
+    เรียก operation(i) count ครั้ง พร้อมกันไม่เกิน concurrency คืน (latency ของแต่ละครั้ง, เวลารวม)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await operation(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(i) for i in range(count)))
+    return latencies, time.perf_counter() - started
+
+
+class Environment:
+    """
+    ของที่ทุก scenario ใช้ร่วมกัน: CTFtime จำลอง, transport ของ Discord ปลอม และ dispatcher ตัวจริง
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.now_ts = int(time.time())
+        self.transport = Transport(latency=args.discord_latency)
+        self.client = FakeClient(self.transport)
+        self.client.create_ctf_embed = create_ctf_embed
+        self.mock = None
+
+    async def __aenter__(self):
+        self.mock = await MockCTFtime(
+            make_events(self.args.events, self.now_ts, seed=self.args.seed), latency=self.args.ctftime_latency
+        ).start()
+        ctftime.base_url = self.mock.base_url
+        sync_worker.limit = self.args.events
+
+        # วัดต้นทุนของโค้ดเราเอง ไม่ใช่เพดาน rate limit ของ Discord (ยกเว้นสั่ง --real-rate-limits)
+        if not self.args.real_rate_limits:
+            dispatcher_module.CHANNEL_RATE = UNLIMITED_RATE
+            dispatcher._global_bucket = TokenBucket(*UNLIMITED_RATE)
+        dispatcher.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await dispatcher.stop()
+        await ctftime.close()
+        await self.mock.stop()
+        subscriptions.flush()
+        return False
+
+    def add_guilds(self, count):
+        guild_ids = []
+        for _ in range(count):
+            guild, channel = self.client.add_guild()
+            config_service.update(guild.id, {
+                "channel_id": channel.id,
+                "limit": 10,
+                "time": "09:00",
+                "notify_roles": [guild.id],
+            })
+            guild_ids.append(guild.id)
+        return guild_ids
+
+
+async def search_throughput(env):
+    from cogs.search import SearchCommands
+
+    args = env.args
+    rng = random.Random(args.seed)
+    await sync_worker.sync_once()
+    cog = SearchCommands(env.client)
+    guild_ids = env.add_guilds(1)
+
+    words = sorted({word for info in event_store.events.values() for word in info.title.split()})
+    formats = [app_commands.Choice(name=value, value=value) for value in ("Jeopardy", "Attack-Defense")]
+    queries = []
+    for _ in range(args.searches):
+        queries.append({
+            "name": rng.choice(words)[:rng.randint(2, 5)] if rng.random() < 0.7 else None,
+            "format": rng.choice(formats) if rng.random() < 0.4 else None,
+            "weight": round(rng.uniform(0, 80), 1) if rng.random() < 0.3 else None,
+        })
+        if not any(queries[-1].values()):
+            queries[-1]["name"] = rng.choice(words)
+
+    async def search(i):
+        interaction = FakeInteraction(env.transport, guild_ids[0])
+        await cog.search.callback(cog, interaction, **queries[i])
+
+    env.transport.reset()
+    requests_before = env.mock.requests
+    latencies, seconds = await drive(search, len(queries), args.concurrency)
+    sent = len(env.transport.sent)
+
+    async def autocomplete(i):
+        interaction = FakeInteraction(env.transport, guild_ids[0])
+        await cog.name_autocomplete(interaction, (queries[i]["name"] or "")[:3])
+
+    autocomplete_latencies, autocomplete_seconds = await drive(autocomplete, len(queries), args.concurrency)
+    cog.cog_unload()
+
+    return summarize(
+        latencies,
+        seconds,
+        events=len(event_store),
+        messages_sent=sent,
+        upstream_requests=env.mock.requests - requests_before,
+        autocomplete=summarize(autocomplete_latencies, autocomplete_seconds),
+    )
+
+
+async def digest_fanout(env):
+    from digest import digest_builder
+
+    args = env.args
+    await sync_worker.sync_once()
+    guild_ids = env.add_guilds(args.guilds)
+    fire_ts = env.now_ts + 60
+    env.transport.reset()
+    requests_before = env.mock.requests
+    render_before = render_cache_info()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(digest_builder.warm(env.client, guild_id, fire_ts) for guild_id in guild_ids))
+    warmup_seconds = time.perf_counter() - started
+
+    # latency ที่วัดคือเวลาตั้งแต่ถึงกำหนดจนส่งเสร็จ งานเตรียมทำไปแล้วตอน warm-up
+    latencies, seconds = await drive(
+        lambda i: digest_builder.send(env.client, guild_ids[i], fire_ts), len(guild_ids), args.digest_concurrency
+    )
+    render_after = render_cache_info()
+
+    return summarize(
+        latencies,
+        seconds,
+        guilds=len(guild_ids),
+        messages_sent=len(env.transport.sent),
+        upstream_requests=env.mock.requests - requests_before,
+        warmup_ms=round(warmup_seconds * 1000, 3),
+        payloads_built=digest_builder.built,
+        payloads_reused=digest_builder.reused,
+        render_cache_hits=render_after.hits - render_before.hits,
+        render_cache_misses=render_after.misses - render_before.misses,
+    )
+
+
+async def reaction_storm(env):
+    from cogs.subscribe import Subscribe
+
+    args = env.args
+    rng = random.Random(args.seed)
+    await sync_worker.sync_once()
+    (guild_id,) = env.add_guilds(1)
+    channel = env.client.get_channel(config_service.get(guild_id, "channel_id"))
+    cog = Subscribe(env.client)
+
+    embeds = [create_ctf_embed(info) for info in event_store.window(env.now_ts, env.now_ts + 7 * DAY, limit=10)]
+    message = (await send_embeds(channel, embeds, content="bench digest"))[0]
+    users = [env.client.add_user() for _ in range(args.users)]
+
+    payloads = []
+    for _ in range(args.reactions):
+        user = rng.choice(users)
+        payloads.append((rng.random() < args.toggle_ratio, SimpleNamespace(
+            guild_id=guild_id,
+            channel_id=channel.id,
+            message_id=message.id,
+            message_author_id=env.client.user.id,
+            member=user,
+            user_id=user.id,
+            emoji=rng.choice(NUMBER_EMOJIS[:len(message.embeds)]),
+        )))
+
+    async def react(i):
+        remove, payload = payloads[i]
+        if remove:
+            await cog.on_raw_reaction_remove(payload)
+        else:
+            await cog.on_raw_reaction_add(payload)
+
+    env.transport.reset()
+    flushes_before = subscriptions.flushes
+    requests_before = env.mock.requests
+    latencies, seconds = await drive(react, len(payloads), args.concurrency)
+    subscriptions.flush()
+    coalesced = dispatcher.coalesced
+    await dispatcher.stop()
+    dispatcher.start()
+
+    return summarize(
+        latencies,
+        seconds,
+        users=len(users),
+        dms_sent=len(env.transport.sent),
+        dms_coalesced=coalesced,
+        storage_flushes=subscriptions.flushes - flushes_before,
+        upstream_requests=env.mock.requests - requests_before,
+    )
+
+
+async def scheduler_scan(env):
+    from cogs.subscribe import Subscribe
+
+    args = env.args
+    rng = random.Random(args.seed)
+    guild_ids = env.add_guilds(max(1, args.guilds // 10))
+
+    # งานที่จะเริ่มในอีกไม่ถึงหนึ่งวัน เวลาแจ้งเตือนจึงถึงแล้วทั้งหมด
+    event_count = max(1, min(args.events, args.subscriptions // 20))
+    events = make_events(event_count, env.now_ts, seed=args.seed, horizon=DAY - 60 * 60)
+    with storage.transaction():
+        for info in events:
+            storage.add_event(info["id"], info)
+
+    started = time.perf_counter()
+    for n in range(args.subscriptions):
+        subscriptions.add(rng.choice(events)["id"], 1000 + n, rng.choice(guild_ids))
+    subscriptions.flush()
+    write_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cog = Subscribe(env.client)
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    due = cog.scheduler.pop_due()
+    scan_seconds = time.perf_counter() - started
+
+    env.transport.reset()
+    latencies, seconds = await drive(lambda i: cog.on_deadline(due[i]), len(due), args.concurrency)
+    await dispatcher.stop()
+    dispatcher.start()
+
+    return summarize(
+        latencies,
+        seconds,
+        events=event_count,
+        subscriptions=args.subscriptions,
+        due=len(due),
+        messages_sent=len(env.transport.sent),
+        subscribe_write_ms=round(write_seconds * 1000, 3),
+        scheduler_load_ms=round(load_seconds * 1000, 3),
+        scheduler_scan_ms=round(scan_seconds * 1000, 3),
+    )
+
+
+SCENARIOS = {
+    "search": search_throughput,
+    "digest": digest_fanout,
+    "reactions": reaction_storm,
+    "scheduler": scheduler_scan,
+}
+
+
+async def run_scenario(name, args):
+    async with Environment(args) as env:
+        return await SCENARIOS[name](env)
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+
+
+class CacheEntry:
+    __slots__ = ("value", "expires_at", "etag", "last_modified")
+
+    def __init__(self, value, expires_at, etag=None, last_modified=None):
+        self.value = value
+        self.expires_at = expires_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self, now=None):
+        return (now or time.monotonic()) < self.expires_at
+
+
+class TTLCache:
+    """
+    LRU cache ที่แต่ละ entry มี TTL ของตัวเอง เก็บ ETag/Last-Modified ไว้ revalidate ได้
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get_entry(self, key):
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        if entry is None or not entry.is_fresh():
+            self.misses += 1
+            return default
+        self.hits += 1
+        return entry.value
+
+    def set(self, key, value, ttl, etag=None, last_modified=None):
+        self._data[key] = CacheEntry(value, time.monotonic() + ttl, etag, last_modified)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def touch(self, key, ttl):
+        entry = self._data.get(key)
+        if entry is not None:
+            entry.expires_at = time.monotonic() + ttl
+            self.revalidated += 1
+        return entry
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry.value
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -2,12 +2,13 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from config import load_config, save_config
 
 
 class ConfigurationGroup(app_commands.Group):
     def __init__(self):
-        super().__init__(name="config", description="ตั้งค่าครับ")
+        super().__init__(name="config", description="ตั้งค่าครับ", guild_only=True)
     
 
     def validate_time_format(self, time_str: str):
@@ -68,13 +69,14 @@ class ConfigurationGroup(app_commands.Group):
 
 
     @app_commands.default_permissions(manage_guild=False) 
-    @app_commands.command(name="setconfig", description="Set configurable bot options (limit, channel, roles, time)")
+    @app_commands.command(name="setconfig", description="Set configurable bot options (limit, channel, roles, time, timezone)")
     @app_commands.describe(
         limit="จำนวน CTF ที่ต้องดึง",
-        time="เวลาที่ต้องการแจ้งเตือน ชม:นาที เช่น 00:00 ตามรูปแบบเวลาไทย", 
+        time="เวลาที่ต้องการแจ้งเตือน ชม:นาที เช่น 00:00 ตาม timezone ที่ตั้งไว้", 
         channel="ส่งไปช่องไหน", 
         admin_roles="Role ผู้ดูแลที่สามารถตั้งค่าบอทได้ (พิมพ์ @role1 @role2)", 
-        notify_roles="Role ที่ได้รับการแจ้งเตือน (พิมพ์ @role1 @role2)"
+        notify_roles="Role ที่ได้รับการแจ้งเตือน (พิมพ์ @role1 @role2)",
+        timezone="Timezone ของเวลาแจ้งเตือน เช่น Asia/Bangkok (ค่าเริ่มต้น)"
     )
     async def setconfig(
         self,
@@ -83,10 +85,11 @@ class ConfigurationGroup(app_commands.Group):
         time: Optional[str] = None,
         channel: Optional[discord.TextChannel] = None,
         admin_roles: Optional[str] = None,
-        notify_roles: Optional[str] = None
+        notify_roles: Optional[str] = None,
+        timezone: Optional[str] = None
     ):
         await interaction.response.defer(ephemeral=True)
-        config = load_config()
+        config = load_config(interaction.guild_id)
         
         configured_admin_roles = config.get('admin_roles', [])
         user_permissions = interaction.user.guild_permissions
@@ -111,7 +114,7 @@ class ConfigurationGroup(app_commands.Group):
         if time is not None:
             is_valid, error_msg = self.validate_time_format(time)
             if not is_valid:
-                return await interaction.followup.send(f"❌ รูปแบบเวลาไม่ถูกต้อง: **{time}**\nกรุณาใช้รูปแบบ `HH:MM` หรือ `H:MM` และค่าต้องอยู่ระหว่าง 00:00 - 23:59 ตามรูปแบบเวลาไทย\nข้อผิดพลาด: {error_msg}", ephemeral=True)
+                return await interaction.followup.send(f"❌ รูปแบบเวลาไม่ถูกต้อง: **{time}**\nกรุณาใช้รูปแบบ `HH:MM` หรือ `H:MM` และค่าต้องอยู่ระหว่าง 00:00 - 23:59 ตาม timezone ที่ตั้งไว้\nข้อผิดพลาด: {error_msg}", ephemeral=True)
 
             config['time'] = time
             changes.append(f"Time: **{time}**")
@@ -142,11 +145,20 @@ class ConfigurationGroup(app_commands.Group):
                 await interaction.followup.send(f"❌ {e}", ephemeral=True)
                 return
 
+        if timezone is not None:
+            try:
+                ZoneInfo(timezone)
+            except (ZoneInfoNotFoundError, ValueError):
+                return await interaction.followup.send(f"❌ ไม่รู้จัก Timezone: **{timezone}** (ตัวอย่าง: Asia/Bangkok)", ephemeral=True)
+
+            config['timezone'] = timezone
+            changes.append(f"Timezone: **{timezone}**")
+
         if not changes:
             await interaction.followup.send("ท่านไม่ได้ระบุค่าที่ต้องการตั้งค่าใดๆ ครับ.", ephemeral=True)
             return
             
-        save_config(config)
+        save_config(interaction.guild_id, config)
         
         response_message = "บันทึกการตั้งค่าเรียบร้อยแล้วครับ:\n" + "\n".join(f"- {c}" for c in changes)
         await interaction.followup.send(response_message, ephemeral=True)
@@ -171,7 +183,7 @@ class ConfigurationGroup(app_commands.Group):
         roles: Optional[str] = None
     ):
         await interaction.response.defer(ephemeral=True)
-        config = load_config()
+        config = load_config(interaction.guild_id)
 
         configured_admin_roles = config.get('admin_roles', [])
         user_permissions = interaction.user.guild_permissions
@@ -208,7 +220,7 @@ class ConfigurationGroup(app_commands.Group):
 
         config[current_roles_key] = new_roles
         
-        save_config(config)
+        save_config(interaction.guild_id, config)
         
         if roles_removed > 0:
             response_message = f"✅ ลบ Role ออกจากรายการ **{current_roles_key}** จำนวน **{roles_removed}** รายการเรียบร้อยแล้ว."
@@ -2,12 +2,90 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from typing import Optional
-import requests
 from datetime import datetime
 import time
-from config import load_config
+from config import config_service
+from ctftime import CTFtimeError, ctftime
+from dispatcher import PRIORITY_INTERACTION, dispatcher
+from event_index import event_index
+from messaging import MAX_EMBEDS_PER_MESSAGE, chunk_embeds, number_embeds, record_posted, send_embeds, stale_notice
+from sync import event_store, sync_worker
 
-GUILD_ID = discord.Object(id=978976733296459807)
+SEARCH_VIEW_TIMEOUT = 5 * 60
+MAX_CHOICES = 25
+MAX_CHOICE_LENGTH = 100
+
+
+class SearchResultsView(discord.ui.View):
+    """
+    ผลการค้นหาแบบแบ่งหน้าในข้อความเดียว สร้าง embed เฉพาะหน้าที่ถูกเปิด และทิ้งผลลัพธ์เมื่อหมดเวลา
+    """
+
+    def __init__(self, client, results, page_size, notice=""):
+        super().__init__(timeout=SEARCH_VIEW_TIMEOUT)
+        self.client = client
+        self.results = results
+        self.notice = notice
+        self.page_size = max(1, min(page_size, MAX_EMBEDS_PER_MESSAGE))
+        # จุดเริ่มของแต่ละหน้าที่เคยเปิด (ขนาดหน้าอาจเล็กลงถ้า embed ยาวเกินขีดจำกัดของข้อความ)
+        self.offsets = [0]
+        self.page = 0
+        self.message = None
+
+    def _embeds(self, start):
+        rendered = []
+        for position, info in enumerate(self.results[start:start + self.page_size], start):
+            try:
+                rendered.append((position, self.client.create_ctf_embed(info)))
+            except Exception as e:
+                print(f"Error creating embed for CTF {info.id}: {e}")
+        return rendered
+
+    def render(self):
+        start = self.offsets[self.page]
+        rendered = self._embeds(start)
+        embeds = next(chunk_embeds([embed for _, embed in rendered]), [])
+        end = min(start + self.page_size, len(self.results))
+        if len(embeds) < len(rendered):
+            end = rendered[len(embeds)][0]
+        if self.page + 1 == len(self.offsets) and end < len(self.results):
+            self.offsets.append(end)
+
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = end >= len(self.results)
+        content = (
+            f"✅ พบงาน CTF ที่ตรงตามเงื่อนไข **{len(self.results)}** รายการ "
+            f"(แสดงรายการที่ {start + 1}-{end})"
+        )
+        if self.notice:
+            content += f"\n{self.notice}"
+        return content, number_embeds(embeds)
+
+    async def _show(self, interaction):
+        content, embeds = self.render()
+        await interaction.response.edit_message(content=content, embeds=embeds, view=self)
+        record_posted(interaction.message, embeds, replace=True)
+
+    @discord.ui.button(label="Previous", emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = max(0, self.page - 1)
+        await self._show(interaction)
+
+    @discord.ui.button(label="Next", emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = min(self.page + 1, len(self.offsets) - 1)
+        await self._show(interaction)
+
+    async def on_timeout(self):
+        self.results = []
+        self.offsets = [0]
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
 
 class SearchCommands(commands.Cog):
     """
@@ -15,10 +93,14 @@ class SearchCommands(commands.Cog):
     """
     def __init__(self, client):
         self.client = client
-        self.GUILD_ID = GUILD_ID
+        event_index.apply(list(event_store.events.values()), [], [])
+        event_store.subscribe(event_index.apply)
+
+    def cog_unload(self):
+        event_store.unsubscribe(event_index.apply)
 
     @app_commands.command(name="search", description="Command to search CTF you need to")
-    @app_commands.guilds(GUILD_ID)
+    @app_commands.guild_only()
     @app_commands.describe(
         name="ชื่องานที่ต้องการ",
         format="รูปแบบของงาน",
@@ -55,17 +137,18 @@ class SearchCommands(commands.Cog):
         await interaction.response.defer(ephemeral=False) 
 
         if ctf_id:
-            url = f"https://ctftime.org/api/v1/events/{ctf_id}/"
             try:
-                response = requests.get(url)
-                response.raise_for_status()
-                info = response.json()
+                info = event_store.get(ctf_id) or await ctftime.get_event(ctf_id)
                 
-                if 'detail' in info or not info.get('id'): 
+                if not info: 
                     return await interaction.followup.send(f"❌ ไม่พบ CTF ID: `{ctf_id}` ในระบบ CTFTime")
 
                 embed = self.client.create_ctf_embed(info)
-                return await interaction.followup.send(f"✅ พบผลลัพธ์สำหรับ CTF ID: `{ctf_id}`", embed=embed)
+                await send_embeds(interaction.followup, [embed], content=f"✅ พบผลลัพธ์สำหรับ CTF ID: `{ctf_id}`", priority=PRIORITY_INTERACTION)
+                return
+            except CTFtimeError as e:
+                print(f"CTFtime unavailable during CTF ID search: {e}")
+                return await interaction.followup.send("❌ CTFtime ไม่ตอบสนองในขณะนี้ ลองใหม่อีกครั้งภายหลัง")
             except Exception as e:
                 print(f"Error during CTF ID search: {e}")
                 return await interaction.followup.send(f"❌ เกิดข้อผิดพลาดในการค้นหา CTF ID: {e}")
@@ -76,55 +159,54 @@ class SearchCommands(commands.Cog):
         now_ts = int(time.time())
         three_months_later = now_ts + 90 * 24 * 60 * 60 
         
-        url = f"https://ctftime.org/api/v1/events/?limit=100&start={now_ts}&finish={three_months_later}"
-        
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            ctf_list = response.json()
-        except Exception as e:
-            return await interaction.followup.send(f"❌ เกิดข้อผิดพลาดในการดึงรายการ CTF: {e}")
-        
-        
-        results = []
+            await sync_worker.ensure_synced()
+        except CTFtimeError as e:
+            print(f"CTFtime unavailable during search: {e}")
+            return await interaction.followup.send("❌ CTFtime ไม่ตอบสนองในขณะนี้ ลองใหม่อีกครั้งภายหลัง")
         
-        for ctf in ctf_list:
-            match = True
-            
-            if name and name.lower() not in ctf.get('title', '').lower():
-                match = False
-            
-            if format and format.value != ctf.get('format'):
-                match = False
-
-            if weight is not None and ctf.get('weight', 0.0) < weight:
-                match = False
-                
-            if location:
-                is_onsite = ctf.get('onsite', False)
-                required_onsite = location.value == 'onsite'
-                if is_onsite != required_onsite:
-                    match = False
-            
-            if restrictions and restrictions.value != ctf.get('restrictions'):
-                match = False
-                
-            if match:
-                results.append(ctf)
+        results = [
+            info for info in event_index.search(
+                name=name,
+                format=format.value if format else None,
+                weight=weight,
+                onsite=location.value == 'onsite' if location else None,
+                restrictions=restrictions.value if restrictions else None,
+            )
+            if now_ts <= (info.start_ts or 0) <= three_months_later
+        ]
 
-        config = load_config()
+        limit = config_service.get(interaction.guild_id, 'limit', 10)
         if not results:
              return await interaction.followup.send("🔍 ไม่พบงาน CTF ที่ตรงตามเงื่อนไขที่คุณระบุในช่วง 3 เดือนข้างหน้า.", ephemeral=False)
-        
-        await interaction.followup.send(f"✅ พบงาน CTF ที่ตรงตามเงื่อนไข **{len(results)}** รายการ แสดงผมรายการสูงสุด **{config['limit']}** รายการ")
-        
-        for info in results[:config['limit']]:
-            try:
-                embed = self.client.create_ctf_embed(info)
-                await interaction.channel.send(embed=embed)
-            except Exception as e:
-                print(f"Error creating embed for CTF {info.get('id', 'Unknown')}: {e}")
-                pass 
+
+        view = SearchResultsView(self.client, results, limit, notice=stale_notice(event_store))
+        content, embeds = view.render()
+        view.message = await dispatcher.send(
+            interaction.followup, PRIORITY_INTERACTION, content=content, embeds=embeds, view=view
+        )
+        record_posted(view.message, embeds)
+
+    @search.autocomplete("name")
+    async def name_autocomplete(self, interaction: discord.Interaction, current: str):
+        titles = []
+        for info in event_index.suggest(current, limit=MAX_CHOICES * 2):
+            title = info.title[:MAX_CHOICE_LENGTH]
+            if title and title not in titles:
+                titles.append(title)
+        return [app_commands.Choice(name=title, value=title) for title in titles[:MAX_CHOICES]]
+
+    @search.autocomplete("ctf_id")
+    async def ctf_id_autocomplete(self, interaction: discord.Interaction, current: str):
+        current = str(current or "")
+        if current.strip().isdigit():
+            events = event_index.suggest_ids(current, limit=MAX_CHOICES)
+        else:
+            events = event_index.suggest(current, limit=MAX_CHOICES)
+        return [
+            app_commands.Choice(name=f"{info.id} - {info.title}"[:MAX_CHOICE_LENGTH], value=info.id)
+            for info in events
+        ]
 
 async def setup(client):
     await client.add_cog(SearchCommands(client))
\ No newline at end of file
@@ -1,165 +1,247 @@
+import asyncio
 import discord
 from discord.ext import commands, tasks
-import requests
-from datetime import datetime, timedelta, timezone
-import json
-from config import load_subscribe, save_subscribe ,load_config
-
-config = load_config()
-
-SUBSCRIBE_CHANNEL_ID = config.get("channel_id")
+import time
+from config import config_service
+from ctftime import CTFtimeError, ctftime
+from dispatcher import PRIORITY_REMINDER, dispatcher
+from messaging import is_indexed, reaction_target, record_posted, send_mentions
+from metrics import SCHEDULER_BACKLOG
+from scheduler import DeadlineScheduler
+from storage import EXPIRE_AFTER_NOTIFIED, NOTIFY_BEFORE, storage
+from subscriptions import subscriptions
+from sync import event_store
+
+CHANNEL_RETRY_DELAY = 60
 
 class Subscribe(commands.Cog):
     def __init__(self, client):
         self.client = client
-        self.subscribe_check_loop.start() 
+        self.scheduler = DeadlineScheduler()
+        self.scheduler_task = None
+        # ctf_id -> guild ที่ส่ง reminder สำเร็จแล้ว ใช้ตอนต้องลองส่งใหม่ให้เฉพาะ guild ที่ยังไม่ได้
+        self.delivered = {}
+
+        for ctf_id, start_ts, notify_ts, notified in storage.event_deadlines():
+            self.schedule_event(ctf_id, start_ts, notify_ts, notified)
+
+    async def cog_load(self):
+        self.scheduler_task = asyncio.create_task(self.scheduler.run(self.on_deadline))
+        event_store.subscribe(self.on_events_changed)
+        self.refresh_loop.start()
+        SCHEDULER_BACKLOG.set_function(lambda: len(self.scheduler), scheduler="reminders")
 
     def cog_unload(self):
-        self.subscribe_check_loop.cancel()
+        if self.scheduler_task:
+            self.scheduler_task.cancel()
+        event_store.unsubscribe(self.on_events_changed)
+        self.refresh_loop.cancel()
+        SCHEDULER_BACKLOG.remove_function(scheduler="reminders")
+
+    def schedule_event(self, ctf_id, start_ts, notify_ts, notified):
+        if start_ts is None:
+            self.scheduler.schedule(ctf_id, 0)
+        elif not notified:
+            self.scheduler.schedule(ctf_id, notify_ts)
+        else:
+            self.scheduler.schedule(ctf_id, start_ts + EXPIRE_AFTER_NOTIFIED)
+
+    async def resolve_target(self, payload):
+        target = reaction_target(payload.message_id, payload.emoji)
+        if target is not None or is_indexed(payload.message_id):
+            return target
+        # event ตอนเอา reaction ออกไม่มี message_author_id ต้องไปดูจากข้อความที่ fetch มาแทน
+        author_id = payload.message_author_id
+        if author_id is not None and author_id != self.client.user.id:
+            return None
+
+        # ข้อความเก่าที่โพสต์ก่อนมี index ดึงมาครั้งเดียวแล้วบันทึกไว้ (ไม่มี CTF ก็บันทึกว่าไม่มี)
+        channel = self.client.get_channel(payload.channel_id)
+        if channel is None:
+            return None
+        try:
+            message = await channel.fetch_message(payload.message_id)
+        except discord.HTTPException:
+            return None
+        # ข้อความของคนอื่นก็บันทึกว่าไม่มี CTF ไว้ จะได้ไม่ fetch ซ้ำ
+        own = message.author.id == self.client.user.id
+        record_posted(message, message.embeds if own else [], replace=True)
+        return reaction_target(payload.message_id, payload.emoji)
+
+    def refresh_event(self, info):
+        ctf_id = info.id
+        event = storage.get_event(ctf_id)
+        if event is None or event["info"] == info:
+            return
 
-    @commands.Cog.listener()
-    async def on_reaction_add(self, reaction: discord.Reaction, user: discord.User):
-        if user.bot or not reaction.message.embeds:
+        old_info = event["info"]
+        timing_changes = [
+            field for field in ("start", "finish") if getattr(old_info, field) != getattr(info, field)
+        ]
+        if not timing_changes:
+            storage.update_event(ctf_id, info)
             return
 
-        embed = reaction.message.embeds[0]
-        footer_text = embed.footer.text
+        # เลื่อนวันไปแล้วเวลาแจ้งเตือนใหม่ยังไม่ถึง ให้แจ้งเตือนใหม่อีกรอบ
+        new_start_ts = info.start_ts
+        reset_notified = new_start_ts is not None and new_start_ts - NOTIFY_BEFORE > time.time()
+        with storage.transaction():
+            storage.update_event(ctf_id, info, reset_notified=reset_notified)
+            for field in timing_changes:
+                storage.log_event_change(ctf_id, field, getattr(old_info, field), getattr(info, field))
+        for field in timing_changes:
+            print(f"CTF {ctf_id} {field} changed: {getattr(old_info, field)} -> {getattr(info, field)}")
+        if reset_notified:
+            self.delivered.pop(ctf_id, None)
+
+        event = storage.get_event(ctf_id)
+        self.schedule_event(ctf_id, event["start_ts"], event["notify_ts"], event["notified"])
+
+    def on_events_changed(self, added, changed, removed):
+        for info in added + changed:
+            self.refresh_event(info)
+
+    @tasks.loop(hours=1)
+    async def refresh_loop(self):
+        # event ที่ติดตามแต่อยู่นอกช่วงที่ sync worker ดึงมา ให้ re-fetch แบบ conditional (ETag) แทน
+        for ctf_id in storage.event_ids():
+            if event_store.get(ctf_id) is not None:
+                continue
+            try:
+                info = await ctftime.get_event(ctf_id)
+            except CTFtimeError as e:
+                print(f"Error refreshing CTF {ctf_id}: {e}")
+                continue
+            if info:
+                self.refresh_event(info)
 
-        if "CTF ID: " not in footer_text:
+    def drop_event(self, ctf_id):
+        storage.delete_event(ctf_id)
+        subscriptions.drop_event(ctf_id)
+        self.scheduler.cancel(ctf_id)
+        self.delivered.pop(ctf_id, None)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        user = payload.member
+        if payload.guild_id is None or user is None or user.bot:
             return
-        
-        try:
-            ctf_id = footer_text.split("CTF ID: ")[-1] 
-        except Exception:
-            return 
 
-        data = load_subscribe()
-        
-        if ctf_id not in data.get('events', {}):
-            response = requests.get(f"https://ctftime.org/api/v1/events/{ctf_id}/")
-            if response.status_code == 200:
-                if 'events' not in data:
-                    data['events'] = {} 
-                data['events'][ctf_id] = {
-                    "info": response.json(),
-                    "subscribers": [],
-                    "notified": False
-                }
-            else:
-                return 
-        
-        if user.id not in data['events'][ctf_id]['subscribers']:
-            data['events'][ctf_id]['subscribers'].append(user.id)
-            save_subscribe(data)
-            
+        target = await self.resolve_target(payload)
+        if target is None:
+            return
+        ctf_id, title = target
+
+        if not storage.has_event(ctf_id):
             try:
-                dm_channel = await user.create_dm() 
-                await dm_channel.send(f"✅ รอรับการแจ้งเตือนสำหรับ CTF: **{embed.title}** แล้ว\n\nบอทจะส่งข้อความแจ้งเตือนใน Public Channel 1 วันก่อนงานเริ่ม!")
-            except discord.Forbidden:
-                pass 
+                info = event_store.get(ctf_id) or await ctftime.get_event(ctf_id)
+            except CTFtimeError as e:
+                print(f"Error fetching CTF {ctf_id}: {e}")
+                dispatcher.send_dm(
+                    user,
+                    coalesce_key=(user.id, ctf_id),
+                    content=f"⚠️ ติดตาม CTF: **{title}** ไม่สำเร็จเพราะ CTFtime ไม่ตอบสนอง ลองกด reaction ใหม่อีกครั้งภายหลัง",
+                )
+                return
+
+            if not info:
+                return
+            if storage.add_event(ctf_id, info):
+                event = storage.get_event(ctf_id)
+                self.schedule_event(ctf_id, event["start_ts"], event["notify_ts"], event["notified"])
+        
+        if subscriptions.add(ctf_id, user.id, payload.guild_id):
+            dispatcher.send_dm(
+                user,
+                coalesce_key=(user.id, ctf_id),
+                content=f"✅ รอรับการแจ้งเตือนสำหรับ CTF: **{title}** แล้ว\n\nบอทจะส่งข้อความแจ้งเตือนใน Public Channel 1 วันก่อนงานเริ่ม!",
+            )
                 
     @commands.Cog.listener()
-    async def on_reaction_remove(self, reaction: discord.Reaction, user: discord.User):
-        if user.bot or not reaction.message.embeds:
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        if payload.guild_id is None or payload.user_id == self.client.user.id:
             return
 
-        embed = reaction.message.embeds[0]
-        footer_text = embed.footer.text
-
-        if "CTF ID: " not in footer_text:
+        target = await self.resolve_target(payload)
+        if target is None:
             return
-        
-        try:
-            ctf_id = footer_text.split("CTF ID: ")[-1] 
-        except Exception:
-            return 
+        ctf_id, title = target
 
-        data = load_subscribe()
-        
-        if ctf_id in data.get('events', {}):
-            if user.id in data['events'][ctf_id]['subscribers']:
-                data['events'][ctf_id]['subscribers'].remove(user.id)
-                save_subscribe(data)
-                
-                try:
-                    dm_channel = await user.create_dm() 
-                    await dm_channel.send(f"❌ ยกเลิกการแจ้งเตือนสำหรับ CTF: **{embed.title}** เรียบร้อยแล้ว")
-                except discord.Forbidden:
-                    pass 
-                
-                if not data['events'][ctf_id]['subscribers']:
-                    del data['events'][ctf_id]
-                    save_subscribe(data)
+        if subscriptions.remove(ctf_id, payload.user_id):
+            try:
+                user = self.client.get_user(payload.user_id) or await self.client.fetch_user(payload.user_id)
+            except discord.HTTPException:
+                user = None
+
+            if user is not None:
+                dispatcher.send_dm(
+                    user,
+                    coalesce_key=(user.id, ctf_id),
+                    content=f"❌ ยกเลิกการแจ้งเตือนสำหรับ CTF: **{title}** เรียบร้อยแล้ว",
+                )
+            
+            if not subscriptions.count(ctf_id):
+                self.drop_event(ctf_id)
 
 
-    @tasks.loop(seconds=30) 
-    async def subscribe_check_loop(self):
+    async def on_deadline(self, ctf_id):
         await self.client.wait_until_ready()
-        now_utc = datetime.now(timezone.utc)
-        
-        subscribe_data = load_subscribe()
-        
-        channel = self.client.get_channel(SUBSCRIBE_CHANNEL_ID)
-        
-        if not channel:
-            print(f"Error: Fixed subscribe notification channel (ID: {SUBSCRIBE_CHANNEL_ID}) not found or inaccessible.")
+        event = storage.get_event(ctf_id)
+        if event is None:
             return
 
-        events_to_remove = []
+        now_ts = int(time.time())
+        start_ts = event["start_ts"]
 
-        if 'events' not in subscribe_data:
-            subscribe_data['events'] = {}
-            
-        for ctf_id, event_data in subscribe_data['events'].items():
-            ctf_info = event_data['info']
-            start_time_iso = ctf_info.get('start')
-            
-            if event_data.get('notified'):
-                try:
-                    start_dt = datetime.fromisoformat(start_time_iso.replace('Z', '+00:00'))
-                    if now_utc >= start_dt + timedelta(hours=2): 
-                        events_to_remove.append(ctf_id)
-                    continue
-                except (ValueError, TypeError):
-                    events_to_remove.append(ctf_id)
-                    continue
-
-            if not start_time_iso:
-                events_to_remove.append(ctf_id)
+        if start_ts is None or now_ts >= start_ts + EXPIRE_AFTER_NOTIFIED:
+            self.drop_event(ctf_id)
+            return
+
+        if event["notified"]:
+            self.schedule_event(ctf_id, start_ts, event["notify_ts"], True)
+            return
+
+        if now_ts >= start_ts:
+            self.drop_event(ctf_id)
+            return
+
+        try:
+            embed = self.client.create_ctf_embed(event["info"])
+        except AttributeError:
+            print("Error: client.create_ctf_embed not found. Ensure it is defined and set in main.py.")
+            return
+
+        delivered = self.delivered.setdefault(ctf_id, set())
+        failed = False
+        for guild_id, user_ids in subscriptions.by_guild(ctf_id).items():
+            if guild_id in delivered:
                 continue
 
-            try:
-                start_dt = datetime.fromisoformat(start_time_iso.replace('Z', '+00:00'))
-            except ValueError:
-                events_to_remove.append(ctf_id)
+            channel_id = config_service.get(guild_id, "channel_id")
+            channel = self.client.get_channel(channel_id) if channel_id else None
+
+            if not channel:
+                print(f"Error: Subscribe notification channel (ID: {channel_id}) for guild {guild_id} not found or inaccessible.")
+                failed = True
                 continue
-            
-            notify_dt = start_dt - timedelta(days=1)
-            
-            if now_utc >= notify_dt and now_utc < start_dt:
-                
-                try:
-                    embed = self.client.create_ctf_embed(ctf_info)
-                except AttributeError:
-                    print("Error: client.create_ctf_embed not found. Ensure it is defined and set in main.py.")
-                    continue
-                                
-                subscriber_mentions = [f"<@{user_id}>" for user_id in event_data['subscribers']]
-                mention_string = " ".join(subscriber_mentions)
-                
-                message_content = f"🔔 **[1 DAY LEFT]** งานใกล้เริ่มแล้วนะเตรียมพร้อมรึยังพี่ชาย:\n{mention_string}"
-                await channel.send(content=message_content, embed=embed)
 
-                event_data['notified'] = True
-                
-            if now_utc >= start_dt:
-                events_to_remove.append(ctf_id)
+            header = "🔔 **[1 DAY LEFT]** งานใกล้เริ่มแล้วนะเตรียมพร้อมรึยังพี่ชาย:\n"
+            try:
+                await send_mentions(channel, header, user_ids, embeds=[embed], priority=PRIORITY_REMINDER)
+            except discord.HTTPException as e:
+                print(f"Error sending reminder for CTF {ctf_id} to guild {guild_id}: {e}")
+                failed = True
+                continue
+            delivered.add(guild_id)
 
-        for ctf_id in events_to_remove:
-            if ctf_id in subscribe_data['events']:
-                del subscribe_data['events'][ctf_id]
+        # ยังมี guild ที่ส่งไม่สำเร็จ ลองใหม่เฉพาะ guild นั้น ยังไม่ mark ว่าแจ้งแล้ว
+        if failed:
+            self.scheduler.schedule(ctf_id, now_ts + CHANNEL_RETRY_DELAY)
+            return
 
-        save_subscribe(subscribe_data) 
+        storage.mark_notified(ctf_id)
+        self.delivered.pop(ctf_id, None)
+        self.schedule_event(ctf_id, start_ts, event["notify_ts"], True)
 
 async def setup(client):
     await client.add_cog(Subscribe(client))
\ No newline at end of file
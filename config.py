@@ -1,25 +1,77 @@
-import json
+import asyncio
+import copy
+import inspect
 
+from storage import storage
 
-def load_config():
-    try :
-        with open("config.json","r") as f :
-            return json.load(f)
-    except FileNotFoundError :
-        return {}
 
-def save_config(data) :
-    with open("config.json","w") as f:
-        json.dump(data,f,indent=4)
+class ConfigService:
+    """
+    เก็บ config ของแต่ละ guild ไว้ในหน่วยความจำ อ่านจาก storage ครั้งเดียว เขียนกลับแบบ transaction แล้วแจ้ง listener
+    """
 
+    def __init__(self, storage):
+        self._storage = storage
+        self._guilds = None
+        self._listeners = []
 
-def load_subscribe():
-    try :
-        with open("subscribe.json","r") as f :
-            return json.load(f)
-    except FileNotFoundError :
-        return {}
+    def _loaded(self):
+        if self._guilds is None:
+            self._guilds = self._storage.get_guild_configs()
+        return self._guilds
 
-def save_subscribe(data):
-    with open("subscribe.json","w") as f :
-        json.dump(data,f,indent=4)
+    def guilds(self):
+        return list(self._loaded())
+
+    def get(self, guild_id, key, default=None):
+        return copy.deepcopy(self._loaded().get(guild_id, {}).get(key, default))
+
+    def all(self, guild_id):
+        return copy.deepcopy(self._loaded().get(guild_id, {}))
+
+    def update(self, guild_id, data):
+        current = self._loaded().setdefault(guild_id, {})
+        changes = {key: value for key, value in data.items() if key not in current or current[key] != value}
+        removed = [key for key in current if key not in data]
+        if not changes and not removed:
+            return {}
+
+        self._storage.update_config(guild_id, changes, removed)
+        for key in removed:
+            del current[key]
+        current.update(copy.deepcopy(changes))
+
+        published = dict(changes, **{key: None for key in removed})
+        self._publish(guild_id, published)
+        return published
+
+    def set(self, guild_id, key, value):
+        data = self.all(guild_id)
+        data[key] = value
+        return self.update(guild_id, data)
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _publish(self, guild_id, changes):
+        for callback in list(self._listeners):
+            try:
+                result = callback(guild_id, copy.deepcopy(changes))
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                print(f"Error in config listener {callback!r}: {e}")
+
+
+config_service = ConfigService(storage)
+
+
+def load_config(guild_id):
+    return config_service.all(guild_id)
+
+def save_config(guild_id, data) :
+    config_service.update(guild_id, data)
@@ -0,0 +1,296 @@
+import asyncio
+import random
+import re
+import time
+
+import aiohttp
+
+from cache import TTLCache
+from events import Event
+from metrics import CTFTIME_ERRORS, CTFTIME_LATENCY, RATE_LIMITED
+
+BASE_URL = "https://ctftime.org/api/v1"
+USER_AGENT = "CTFtimeBot (+https://github.com/cannyworm/CTFtimeBot)"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+EVENT_LIST_TTL = 5 * 60
+EVENT_TTL = 15 * 60
+WINDOW_GRANULARITY = 5 * 60
+
+# Retry-After ที่นานกว่านี้ไม่รอ ให้ผู้เรียกไปใช้ข้อมูล stale แทน (ผู้ใช้ไม่ควรรอเป็นนาที)
+MAX_RETRY_AFTER = 5
+
+BREAKER_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 60
+
+_MISSING = object()
+_ID_RE = re.compile(r"/\d+/")
+
+
+def _parse_event(info):
+    if not isinstance(info, dict) or "detail" in info or not info.get("id"):
+        return None
+    return Event.from_info(info)
+
+
+def _parse_events(events):
+    # /events/ ต้องได้ list เสมอ object อื่น (เช่น {"detail": ...} ที่มากับ 200) ถ้าวนตาม key จะกลายเป็นรายการว่าง
+    if not isinstance(events, list):
+        raise CTFtimeError(f"CTFtime returned {type(events).__name__} instead of an event list")
+    parsed = (_parse_event(info) for info in events)
+    return [event for event in parsed if event is not None]
+
+
+class CTFtimeError(Exception):
+    pass
+
+
+class CTFtimeUnavailable(CTFtimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    CTFtime ล้มติดกันเกิน threshold ครั้ง ให้ตอบ error ทันทีไประยะหนึ่ง แล้วปล่อยคำขอเดียวไปลองว่าหายหรือยัง
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def remaining(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        # half open: ปล่อยไปทีละคำขอ ถ้าคำขอที่ลองหายไปเฉยๆ (ถูก cancel) ก็ลองใหม่ได้เมื่อครบ reset_timeout
+        now = time.monotonic()
+        if self.probe_started is None or now - self.probe_started >= self.reset_timeout:
+            self.probe_started = now
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probe_started is not None or (self.opened_at is None and self.failures >= self.threshold):
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+
+
+class CTFtimeClient:
+    """
+    Client กลางสำหรับเรียก CTFtime API แบบ async ใช้ session เดียวร่วมกันทุก cog
+    """
+
+    def __init__(self, max_concurrency=4, timeout=10, retries=3, backoff=0.5, cache_size=1024, base_url=BASE_URL):
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.cache = TTLCache(maxsize=cache_size)
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=5)
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+        self.breaker = CircuitBreaker()
+        self.stale_served = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._session
+
+    def _retry_delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        return self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+
+    async def _request(self, path, params=None, headers=None):
+        session = self._get_session()
+        url = f"{self.base_url}{path}"
+        last_error = None
+
+        endpoint = _ID_RE.sub("/{id}/", path)
+
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise CTFtimeUnavailable(
+                    f"CTFtime is unavailable, retrying in {self.breaker.remaining():.0f}s"
+                    + (f" (last error: {last_error})" if last_error else "")
+                )
+
+            retry_after = None
+            status = "error"
+            reason = None
+            started = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    # วัดเฉพาะเวลาที่คุยกับ CTFtime ไม่รวมเวลารอคิว semaphore
+                    started = time.perf_counter()
+                    async with session.get(url, params=params, headers=headers) as response:
+                        status = response.status
+                        if response.status in (304, 404):
+                            self.breaker.record_success()
+                            return response.status, None, response.headers
+                        if response.status in RETRY_STATUSES:
+                            if response.status == 429:
+                                RATE_LIMITED.inc(scope="ctftime")
+                            header = response.headers.get("Retry-After")
+                            if header and header.isdigit():
+                                retry_after = int(header)
+                            raise CTFtimeError(f"CTFtime returned HTTP {response.status} for {path}")
+                        if response.status >= 400:
+                            self.breaker.record_success()
+                        response.raise_for_status()
+                        try:
+                            data = await response.json(content_type=None)
+                        except ValueError as e:
+                            # 200 ที่ไม่ใช่ JSON (เช่นหน้า challenge ของ Cloudflare) นับเป็นความล้มเหลวให้ลองใหม่
+                            reason = "invalid_json"
+                            raise CTFtimeError(f"CTFtime returned invalid JSON for {path}: {e}") from e
+                        self.breaker.record_success()
+                        return response.status, data, response.headers
+            except aiohttp.ClientResponseError as e:
+                CTFTIME_ERRORS.inc(path=endpoint, reason=f"http_{e.status}")
+                raise CTFtimeError(f"CTFtime returned HTTP {e.status} for {path}") from e
+            except (aiohttp.ClientError, asyncio.TimeoutError, CTFtimeError) as e:
+                if reason is None:
+                    reason = f"http_{status}" if status != "error" else type(e).__name__
+                CTFTIME_ERRORS.inc(path=endpoint, reason=reason)
+                self.breaker.record_failure()
+                last_error = e
+            finally:
+                CTFTIME_LATENCY.observe(time.perf_counter() - started, path=endpoint, status=status)
+
+            if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                break
+            if attempt < self.retries:
+                await asyncio.sleep(self._retry_delay(attempt, retry_after))
+
+        raise CTFtimeError(f"CTFtime request failed after {attempt + 1} attempts: {last_error}")
+
+    async def get_json(self, path, params=None, ttl=None, allow_stale=False, parse=None):
+        key = (path, tuple(sorted((params or {}).items())))
+        if ttl is not None:
+            cached = self.cache.get(key, _MISSING)
+            if cached is not _MISSING:
+                return cached
+
+        # คำขอเดียวกันที่ยิงพร้อมกัน (เช่นหลายคนกด reaction งานเดียวกัน) รอผลจากคำขอเดียว
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, path, params, ttl, parse))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        try:
+            return await asyncio.shield(task)
+        except CTFtimeError:
+            entry = self.cache.get_entry(key) if allow_stale else None
+            if entry is None:
+                raise
+            # CTFtime ล่มอยู่ ตอบข้อมูลล่าสุดที่เคยได้ไปก่อน ดีกว่าให้ผู้ใช้เห็น error
+            self.stale_served += 1
+            return entry.value
+
+    async def _fetch(self, key, path, params, ttl, parse=None):
+        # parse แปลง JSON เป็น object ครั้งเดียวก่อนเข้า cache ทุกคนที่อ่าน cache ได้ของที่แปลงแล้ว
+        if ttl is None:
+            _, data, _ = await self._request(path, params)
+            return parse(data) if parse else data
+
+        headers = {}
+        entry = self.cache.get_entry(key)
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        status, data, response_headers = await self._request(path, params, headers or None)
+        if status == 304 and entry is not None:
+            self.cache.touch(key, ttl)
+            return entry.value
+
+        if parse:
+            data = parse(data)
+        self.cache.set(
+            key,
+            data,
+            ttl,
+            etag=response_headers.get("ETag"),
+            last_modified=response_headers.get("Last-Modified"),
+        )
+        return data
+
+    async def get_events(self, start, finish, limit=100):
+        # ปัดช่วงเวลาให้ลงล็อก เพื่อให้คำขอที่ใกล้เคียงกันใช้ cache ตัวเดียวกันได้
+        start -= start % WINDOW_GRANULARITY
+        finish -= finish % WINDOW_GRANULARITY
+        events = await self.get_json(
+            "/events/",
+            params={"limit": limit, "start": start, "finish": finish},
+            ttl=EVENT_LIST_TTL,
+            parse=_parse_events,
+        )
+        # รายการมี field ครบเท่ากับ /events/{id}/ เก็บแยกรายตัวไว้ให้ get_event ไม่ต้องยิงซ้ำ
+        for event in events:
+            self.cache.set(self._event_key(event.id), event, EVENT_TTL)
+        return events
+
+    @staticmethod
+    def _event_key(ctf_id):
+        return (f"/events/{ctf_id}/", ())
+
+    async def get_event(self, ctf_id):
+        path, _ = self._event_key(ctf_id)
+        return await self.get_json(path, ttl=EVENT_TTL, allow_stale=True, parse=_parse_event)
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+ctftime = CTFtimeClient()
@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+import discord
+
+from config import config_service
+from ctftime import CTFtimeError
+from embeds import create_ctf_embed
+from messaging import send_embeds, stale_notice
+from sync import event_store, sync_worker
+
+DIGEST_WARMUP = 5 * 60
+DIGEST_WINDOW = 7 * 24 * 60 * 60
+
+
+class DigestPayload:
+    """
+    ส่วนของ digest ที่ไม่ขึ้นกับ guild (embed ของงานในสัปดาห์หน้า) ใช้ร่วมกันทุก guild ที่ตั้งเวลาและ limit เท่ากัน
+    """
+
+    __slots__ = ("embeds", "footer")
+
+    def __init__(self, embeds, footer):
+        # เก็บเป็น dict เพราะ send_embeds เติมหมายเลขลง footer ของ Embed แต่ละครั้งที่ส่ง
+        self.embeds = embeds
+        self.footer = footer
+
+    def render(self):
+        return [discord.Embed.from_dict(embed) for embed in self.embeds]
+
+
+class PreparedDigest:
+    __slots__ = ("fire_ts", "version", "channel", "content", "payload")
+
+    def __init__(self, fire_ts, version, channel, content, payload):
+        self.fire_ts = fire_ts
+        self.version = version
+        self.channel = channel
+        self.content = content
+        self.payload = payload
+
+
+class DigestBuilder:
+    """
+    เตรียม digest ล่วงหน้า DIGEST_WARMUP วินาทีก่อนถึงเวลา (ดึงข้อมูล, render embed, resolve mention)
+    พอถึงเวลาจริงเหลือแค่ส่ง
+    """
+
+    def __init__(self):
+        self._payloads = {}
+        self._prepared = {}
+        self._warming = {}
+        # เพิ่มทุกครั้งที่ config ของ guild เปลี่ยน digest ที่เตรียมจาก config รุ่นเก่าจะไม่ถูกใช้
+        self._versions = {}
+        self.built = 0
+        self.reused = 0
+
+    async def payload(self, fire_ts, limit):
+        key = (fire_ts, limit)
+        payload = self._payloads.get(key)
+        if payload is not None:
+            self.reused += 1
+            return payload
+
+        try:
+            await sync_worker.ensure_synced()
+        except CTFtimeError as e:
+            # ส่งจากสำเนาล่าสุดที่มี (ถ้ามี) ดีกว่าทิ้ง digest ของวันนี้ไปเลย
+            print(f"Error fetching CTFtime events: {e}")
+
+        events = event_store.window(fire_ts, fire_ts + DIGEST_WINDOW, limit=limit)
+        if not events and event_store.synced_at is None:
+            return None
+
+        embeds = tuple(create_ctf_embed(info).to_dict() for info in events)
+        footer = ""
+        if len(embeds) > 1:
+            footer += "กด reaction ตามหมายเลขใน footer เพื่อรับการแจ้งเตือนงานนั้น\n"
+        notice = stale_notice(event_store)
+        if notice:
+            footer += notice + "\n"
+
+        self.built += 1
+        return self._payloads.setdefault(key, DigestPayload(embeds, footer))
+
+    async def prepare(self, client, guild_id, fire_ts):
+        version = self._versions.get(guild_id, 0)
+        config = config_service.all(guild_id)
+        channel_id = config.get("channel_id")
+        channel = client.get_channel(channel_id)
+
+        if not channel:
+            print(f"Error: Channel with ID {channel_id} not found or inaccessible.")
+            return None
+
+        payload = await self.payload(fire_ts, config.get("limit", 10))
+        if payload is None:
+            print(f"Skipping digest for guild {guild_id}: no CTFtime data available.")
+            return None
+
+        guild = client.get_guild(channel.guild.id) if channel.guild else None
+        everyone_role_id = guild.default_role.id if guild else None
+
+        mention_list = []
+        for role_id in config.get("notify_roles", []):
+            if role_id == everyone_role_id:
+                mention_list.append("@everyone")
+            else:
+                mention_list.append(f"<@&{role_id}>")
+
+        content = f"🔔 แจ้งเตือน CTF time\n{' '.join(mention_list)}\n" + payload.footer
+        prepared = self._prepared[guild_id] = PreparedDigest(fire_ts, version, channel, content, payload)
+        return prepared
+
+    def warm(self, client, guild_id, fire_ts):
+        task = asyncio.ensure_future(self.prepare(client, guild_id, fire_ts))
+        self._warming[guild_id] = task
+
+        def done(_):
+            if self._warming.get(guild_id) is task:
+                del self._warming[guild_id]
+
+        task.add_done_callback(done)
+        return task
+
+    def discard(self, guild_id):
+        # warm-up ที่ยังรันอยู่จะเขียน digest จาก config เก่าทับทีหลัง จึงต้องเปลี่ยน version ด้วย ไม่ใช่แค่ลบทิ้ง
+        self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+        self._prepared.pop(guild_id, None)
+
+    def prune(self, now_ts=None):
+        cutoff = (now_ts or time.time()) - DIGEST_WARMUP
+        for key in [key for key in self._payloads if key[0] < cutoff]:
+            del self._payloads[key]
+
+    async def send(self, client, guild_id, fire_ts):
+        warming = self._warming.get(guild_id)
+        if warming is not None:
+            try:
+                await asyncio.shield(warming)
+            except Exception as e:
+                print(f"Error preparing digest for guild {guild_id}: {e}")
+
+        prepared = self._prepared.pop(guild_id, None)
+        stale = prepared is not None and prepared.version != self._versions.get(guild_id, 0)
+        if prepared is None or stale or prepared.fire_ts != fire_ts:
+            prepared = await self.prepare(client, guild_id, fire_ts)
+            self._prepared.pop(guild_id, None)
+        if prepared is None:
+            return []
+
+        self.prune()
+        return await send_embeds(prepared.channel, prepared.payload.render(), content=prepared.content)
+
+
+digest_builder = DigestBuilder()
+
+
+async def send_digest(client, guild_id, fire_ts=None):
+    fire_ts = int(time.time()) if fire_ts is None else fire_ts
+    return await digest_builder.send(client, guild_id, fire_ts)
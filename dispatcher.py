@@ -0,0 +1,195 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+
+import discord
+
+PRIORITY_REMINDER = 0
+PRIORITY_INTERACTION = 1
+PRIORITY_DIGEST = 2
+PRIORITY_CONFIRMATION = 3
+
+CHANNEL_RATE = (5, 5.0)
+GLOBAL_RATE = (50, 1.0)
+COALESCE_WINDOW = 3.0
+DM_CHANNEL_CACHE_SIZE = 1024
+CHANNEL_STATE_CACHE_SIZE = 1024
+
+
+class TokenBucket:
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        # จองหนึ่ง token แล้วคืนเวลาที่ต้องรอก่อนส่งได้
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens * self.per / self.rate
+
+    def full(self):
+        elapsed = time.monotonic() - self.updated
+        return self.tokens + elapsed * self.rate / self.per >= self.rate
+
+
+class _Job:
+    __slots__ = ("destination", "user", "kwargs", "future")
+
+    def __init__(self, destination, kwargs, future=None, user=None):
+        self.destination = destination
+        self.user = user
+        self.kwargs = kwargs
+        self.future = future
+
+
+class Dispatcher:
+    """
+    คิวกลางของข้อความขาออกทั้งหมด แยก priority, นับ token ตาม channel และรวม DM ที่กดสลับไปมาให้เหลืออันเดียว
+    """
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self._queue = asyncio.PriorityQueue()
+        self._counter = itertools.count()
+        self._channels = OrderedDict()
+        self._global_bucket = TokenBucket(*GLOBAL_RATE)
+        self._dm_channels = OrderedDict()
+        self._pending_dms = {}
+        self._tasks = []
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.coalesced = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout=10):
+        for job in list(self._pending_dms.values()):
+            self._enqueue(PRIORITY_CONFIRMATION, job)
+        self._pending_dms.clear()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Dispatcher stopped with {self._queue.qsize()} messages still queued")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def _enqueue(self, priority, job):
+        self._queue.put_nowait((priority, next(self._counter), job))
+
+    def send(self, destination, priority=PRIORITY_DIGEST, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(priority, _Job(destination, kwargs, future))
+        return future
+
+    def send_dm(self, user, priority=PRIORITY_CONFIRMATION, coalesce_key=None, **kwargs):
+        if coalesce_key is None:
+            self._enqueue(priority, _Job(None, kwargs, user=user))
+            return
+
+        job = self._pending_dms.get(coalesce_key)
+        if job is not None:
+            job.kwargs = kwargs
+            self.coalesced += 1
+            return
+
+        job = self._pending_dms[coalesce_key] = _Job(None, kwargs, user=user)
+
+        def flush():
+            if self._pending_dms.pop(coalesce_key, None) is job:
+                self._enqueue(priority, job)
+
+        asyncio.get_running_loop().call_later(COALESCE_WINDOW, flush)
+
+    async def get_dm_channel(self, user):
+        channel = self._dm_channels.get(user.id)
+        if channel is None:
+            channel = user.dm_channel or await user.create_dm()
+            self._dm_channels[user.id] = channel
+            while len(self._dm_channels) > DM_CHANNEL_CACHE_SIZE:
+                self._dm_channels.popitem(last=False)
+        else:
+            self._dm_channels.move_to_end(user.id)
+        return channel
+
+    @staticmethod
+    def _rate_key(destination):
+        # interaction.followup เป็น Webhook ที่ id คือ application id (เหมือนกันทุก interaction)
+        # แต่ Discord จำกัด rate ตาม token ของแต่ละ interaction จึงต้องแยก bucket ตาม token
+        token = getattr(destination, "token", None)
+        if token is not None:
+            return ("webhook", token)
+        return getattr(destination, "id", None) or id(destination)
+
+    def _channel_state(self, key):
+        state = self._channels.get(key)
+        if state is not None:
+            self._channels.move_to_end(key)
+            return state
+
+        state = self._channels[key] = (TokenBucket(*CHANNEL_RATE), asyncio.Lock())
+        # ทิ้ง channel ที่เก่าที่สุดเฉพาะตัวที่ไม่มีใครถือ lock และ token เต็มแล้ว ลืมไปก็ไม่ทำให้ส่งเกิน rate
+        overflow = len(self._channels) - CHANNEL_STATE_CACHE_SIZE
+        for old_key in list(itertools.islice(self._channels, max(0, overflow))):
+            bucket, lock = self._channels[old_key]
+            if not lock.locked() and bucket.full():
+                del self._channels[old_key]
+        return state
+
+    async def _deliver(self, job):
+        destination = job.destination
+        if destination is None:
+            destination = await self.get_dm_channel(job.user)
+
+        bucket, lock = self._channel_state(self._rate_key(destination))
+
+        # lock ต่อ channel ทำให้ข้อความที่เข้าคิวก่อนถูกส่งก่อนเสมอ
+        async with lock:
+            delay = max(bucket.reserve(), self._global_bucket.reserve())
+            if delay > 0:
+                self.throttled += 1
+                await asyncio.sleep(delay)
+            return await destination.send(**job.kwargs)
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                message = await self._deliver(job)
+                self.sent += 1
+                if job.future is not None and not job.future.done():
+                    job.future.set_result(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                if job.future is not None and not job.future.done():
+                    job.future.set_exception(e)
+                elif not isinstance(e, discord.Forbidden):
+                    print(f"Error sending queued message: {e}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "pending_dms": len(self._pending_dms),
+            "sent": self.sent,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "coalesced": self.coalesced,
+            "channels": len(self._channels),
+        }
+
+
+dispatcher = Dispatcher()
@@ -0,0 +1,74 @@
+from functools import lru_cache
+
+import discord
+
+from events import Event
+
+RENDER_CACHE_SIZE = 512
+
+THUMBNAIL_URL = "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcS7nr78opGAJ7CSFEOM6JccyZhPElGrmeIFOA&s"
+
+
+def format_ctf_time(ts):
+    # Discord แสดง timestamp ตาม timezone ของคนอ่านเอง embed เดียวกันจึงใช้ได้ทุก guild
+    return f"<t:{ts}:f>"
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _render(event):
+    # Event hash/เทียบกันจากทุก field ถ้าค่าใดเปลี่ยน key ของ cache ก็เปลี่ยนตาม
+    start_time = format_ctf_time(event.start_ts)
+    finish_time = format_ctf_time(event.finish_ts)
+    days, hours = event.days, event.hours
+    restrictions = event.restrictions
+
+    embed = discord.Embed(
+        title=event.title,
+        url=event.url,
+        description=event.description,
+        color=discord.Color.dark_red(),
+    )
+    embed.set_thumbnail(url=THUMBNAIL_URL)
+    embed.add_field(
+        name="date", value=f"start: {start_time}\nFinish: {finish_time}", inline=False
+    )
+
+    if days <= 0:
+        embed.add_field(name="duration", value=f"{hours} hour", inline=True)
+    else:
+        embed.add_field(name="duration", value=f"{days} day {hours} hours", inline=True)
+
+    embed.add_field(name="Format", value=event.format, inline=True)
+    embed.add_field(name="onsite", value=event.onsite, inline=True)
+    embed.add_field(name="weight", value=event.weight, inline=True)
+
+    if restrictions == "Individual":
+        embed.add_field(
+            name="restrictions", value=f"{restrictions}", inline=True
+        )
+    else:
+        embed.add_field(
+            name="restrictions",
+            value=f"{restrictions} {event.participants} team will participate",
+            inline=True,
+        )
+
+    embed.set_footer(text=f"CTF ID: {event.id}")
+
+    if event.organizer:
+        embed.set_author(
+            name=event.organizer,
+            url=event.url,
+            icon_url=event.logo,
+        )
+
+    return embed.to_dict()
+
+
+def create_ctf_embed(info):
+    # คืน Embed ใหม่ทุกครั้ง เพราะผู้เรียกอาจแก้ footer ต่อได้
+    return discord.Embed.from_dict(_render(Event.from_info(info)))
+
+
+def render_cache_info():
+    return _render.cache_info()
@@ -0,0 +1,148 @@
+import re
+from bisect import bisect_left, insort
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class EventIndex:
+    """
+    Index ของ CTF ในหน่วยความจำ ใช้ตอบ /search ด้วยการ intersect set แทนการวนทั้ง list
+    """
+
+    def __init__(self):
+        self.events = {}
+        self._tokens = {}
+        self._vocabulary = []
+        self._by_format = {}
+        self._by_onsite = {True: set(), False: set()}
+        self._by_restrictions = {}
+        self._weights = []
+
+    def __len__(self):
+        return len(self.events)
+
+    def _event_tokens(self, event):
+        tokens = set(tokenize(event.title))
+        for organizer in event.organizers:
+            tokens.update(tokenize(organizer))
+        return tokens
+
+    def _add(self, event):
+        ctf_id = event.id
+        self.events[ctf_id] = event
+
+        for token in self._event_tokens(event):
+            postings = self._tokens.get(token)
+            if postings is None:
+                postings = self._tokens[token] = set()
+                insort(self._vocabulary, token)
+            postings.add(ctf_id)
+
+        self._by_format.setdefault(event.format, set()).add(ctf_id)
+        self._by_onsite[event.onsite].add(ctf_id)
+        self._by_restrictions.setdefault(event.restrictions, set()).add(ctf_id)
+        insort(self._weights, (float(event.weight), ctf_id))
+
+    def _discard(self, ctf_id):
+        event = self.events.pop(ctf_id, None)
+        if event is None:
+            return
+
+        for token in self._event_tokens(event):
+            postings = self._tokens.get(token)
+            if postings is None:
+                continue
+            postings.discard(ctf_id)
+            if not postings:
+                del self._tokens[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+
+        self._by_format.get(event.format, set()).discard(ctf_id)
+        self._by_onsite[event.onsite].discard(ctf_id)
+        self._by_restrictions.get(event.restrictions, set()).discard(ctf_id)
+
+        key = (float(event.weight), ctf_id)
+        position = bisect_left(self._weights, key)
+        if position < len(self._weights) and self._weights[position] == key:
+            del self._weights[position]
+
+    def upsert(self, event):
+        ctf_id = event.id
+        current = self.events.get(ctf_id)
+        if current is not None:
+            if current == event:
+                return
+            self._discard(ctf_id)
+        self._add(event)
+
+    def apply(self, added, changed, removed):
+        for ctf_id in removed:
+            self._discard(ctf_id)
+        for event in added + changed:
+            self.upsert(event)
+
+    def _token_matches(self, prefix):
+        matched = set()
+        position = bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+            matched |= self._tokens[self._vocabulary[position]]
+            position += 1
+        return matched
+
+    def _weight_at_least(self, weight):
+        position = bisect_left(self._weights, (weight, float("-inf")))
+        return {ctf_id for _, ctf_id in self._weights[position:]}
+
+    def search(self, name=None, format=None, weight=None, onsite=None, restrictions=None):
+        candidates = []
+
+        if name:
+            tokens = tokenize(name)
+            if not tokens:
+                return []
+            for token in tokens:
+                candidates.append(self._token_matches(token))
+        if format is not None:
+            candidates.append(self._by_format.get(format, set()))
+        if onsite is not None:
+            candidates.append(self._by_onsite[bool(onsite)])
+        if restrictions is not None:
+            candidates.append(self._by_restrictions.get(restrictions, set()))
+        if weight is not None:
+            candidates.append(self._weight_at_least(weight))
+
+        if not candidates:
+            matched = set(self.events)
+        else:
+            candidates.sort(key=len)
+            matched = set(candidates[0])
+            for other in candidates[1:]:
+                if not matched:
+                    break
+                matched &= other
+
+        return sorted(
+            (self.events[ctf_id] for ctf_id in matched),
+            key=lambda event: (event.start_ts or 0, event.id),
+        )
+
+    def suggest(self, text, limit=25):
+        # สำหรับ autocomplete: งานที่ชื่อขึ้นต้นด้วยสิ่งที่พิมพ์มาขึ้นก่อน ที่เหลือเรียงตามวันเริ่ม
+        query = (text or "").strip().lower()
+        if query and not tokenize(query):
+            return []
+        events = self.search(name=query or None)
+        events.sort(key=lambda event: not event.title.lower().startswith(query))
+        return events[:limit]
+
+    def suggest_ids(self, prefix, limit=25):
+        prefix = (prefix or "").strip()
+        matched = sorted(ctf_id for ctf_id in self.events if str(ctf_id).startswith(prefix))
+        return [self.events[ctf_id] for ctf_id in matched[:limit]]
+
+
+event_index = EventIndex()
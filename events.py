@@ -0,0 +1,119 @@
+import sys
+from datetime import datetime, timezone
+
+
+def parse_iso_ts(iso_time):
+    try:
+        return int(datetime.fromisoformat(iso_time.replace("Z", "+00:00")).timestamp())
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def format_iso(ts):
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def _intern(value):
+    # ค่าที่ซ้ำกันข้ามงาน (format, restrictions, ผู้จัด) ให้ชี้ไปที่ string ตัวเดียวกัน
+    # ไม่ใช้กับ description: string ที่ intern แล้วไม่ถูกคืนหน่วยความจำ ข้อความยาวแชร์กันด้วยการใช้ Event ตัวเดิมแทน
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Event:
+    """
+    CTF หนึ่งงาน แปลงจาก JSON ของ CTFtime ครั้งเดียวตอนรับเข้ามา เวลาเก็บเป็น epoch (int)
+    """
+
+    __slots__ = (
+        "id", "title", "url", "description", "start_ts", "finish_ts", "days", "hours",
+        "format", "onsite", "weight", "restrictions", "participants", "organizers", "logo",
+    )
+
+    def __init__(self, id, title="", url="", description="", start_ts=None, finish_ts=None, days=0, hours=0,
+                 format=None, onsite=False, weight=0.0, restrictions=None, participants=None, organizers=(),
+                 logo=None):
+        self.id = id
+        self.title = title
+        self.url = url
+        self.description = description
+        self.start_ts = start_ts
+        self.finish_ts = finish_ts
+        self.days = days
+        self.hours = hours
+        self.format = format
+        self.onsite = onsite
+        self.weight = weight
+        self.restrictions = restrictions
+        self.participants = participants
+        self.organizers = organizers
+        self.logo = logo
+
+    @classmethod
+    def from_info(cls, info):
+        if isinstance(info, cls):
+            return info
+        duration = info.get("duration") or {}
+        return cls(
+            id=int(info["id"]),
+            title=info.get("title") or "",
+            url=info.get("url") or "",
+            description=info.get("description") or "",
+            start_ts=parse_iso_ts(info.get("start")),
+            finish_ts=parse_iso_ts(info.get("finish")),
+            days=duration.get("days", 0),
+            hours=duration.get("hours", 0),
+            format=_intern(info.get("format")),
+            onsite=bool(info.get("onsite", False)),
+            weight=info.get("weight") or 0.0,
+            restrictions=_intern(info.get("restrictions")),
+            participants=info.get("participants"),
+            organizers=tuple(_intern(organizer.get("name")) for organizer in info.get("organizers") or ()),
+            logo=_intern(info.get("logo")),
+        )
+
+    def to_info(self):
+        # รูปเดียวกับ JSON ของ CTFtime (เฉพาะ field ที่บอทใช้) สำหรับเก็บลง storage
+        return {
+            "id": self.id,
+            "title": self.title,
+            "url": self.url,
+            "description": self.description,
+            "start": self.start,
+            "finish": self.finish,
+            "duration": {"days": self.days, "hours": self.hours},
+            "format": self.format,
+            "onsite": self.onsite,
+            "weight": self.weight,
+            "restrictions": self.restrictions,
+            "participants": self.participants,
+            "organizers": [{"name": name} for name in self.organizers],
+            "logo": self.logo,
+        }
+
+    @property
+    def start(self):
+        return format_iso(self.start_ts)
+
+    @property
+    def finish(self):
+        return format_iso(self.finish_ts)
+
+    @property
+    def organizer(self):
+        return self.organizers[0] if self.organizers else None
+
+    def _key(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, Event):
+            return NotImplemented
+        return self is other or self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"<Event id={self.id} title={self.title!r} start_ts={self.start_ts}>"
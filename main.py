@@ -1,150 +1,159 @@
 import asyncio
+import hashlib
+import json
+import os
+import signal
 import time
-from datetime import datetime, timedelta
 
 import discord
-import requests
-from constants import GUILD_ID, Token, save_config
+from constants import GUILD_ID, Token
 from discord import app_commands
-from discord.ext import commands, tasks
-
-from config import load_config
+from discord.ext import commands
+
+from config import config_service
+from ctftime import ctftime
+from digest import DIGEST_WARMUP, digest_builder, send_digest
+from dispatcher import dispatcher
+from embeds import create_ctf_embed, render_cache_info
+from metrics import (
+    CACHE_REQUESTS, CACHE_SIZE, COMMAND_LATENCY, CTFTIME_CIRCUIT_OPEN, CTFTIME_CIRCUIT_TRIPS, MESSAGES,
+    RATE_LIMITED, SCHEDULER_BACKLOG, metrics_server,
+)
+from scheduler import DEFAULT_TIMEZONE, DeadlineScheduler, next_fire, previous_fire
+from storage import storage
+from subscriptions import subscriptions
+from sync import event_store, sync_worker
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.reactions = True
 intents.members = True
-client = commands.Bot(command_prefix="!", intents=intents)
 
+# reaction ใช้ raw event + index ใน storage แล้ว ไม่ต้องพึ่ง message cache
+MESSAGE_CACHE_SIZE = None
 
-@bot.event
-async def on_guild_join(guild):
-    save_config(guild.id)
+# รันหลาย process ได้โดยแบ่ง shard กัน แต่ละ process ควรใช้ CTFTIMEBOT_DB ของตัวเอง
+SHARD_COUNT = os.environ.get("CTFTIMEBOT_SHARD_COUNT")
+SHARD_IDS = os.environ.get("CTFTIMEBOT_SHARD_IDS")
 
-    print(f"Updated GUILD_ID → {guild.id}")
 
+class CommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # จดเวลาเริ่มไว้ วัด latency ของแต่ละคำสั่งตอนจบ
+        interaction.extras["started"] = time.perf_counter()
+        return True
 
-def create_ctf_embed(info):
-    def format_ctf_time(iso_time: str):
-        dt = datetime.fromisoformat(iso_time.replace("Z", "+00:00"))
-        dt_th = dt + timedelta(hours=7)
-        return dt_th.strftime("%d/%m/%Y %H:%M")
 
-    start_time = format_ctf_time(info["start"])
-    finish_time = format_ctf_time(info["finish"])
+def observe_command(interaction, status):
+    started = interaction.extras.get("started")
+    command = interaction.command
+    if started is not None and command is not None:
+        COMMAND_LATENCY.observe(time.perf_counter() - started, command=command.qualified_name, status=status)
 
-    embed = discord.Embed(
-        title=info["title"],
-        url=info["url"],
-        description=info["description"],
-        color=discord.Color.dark_red(),
-    )
-    embed.set_thumbnail(
-        url="https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcS7nr78opGAJ7CSFEOM6JccyZhPElGrmeIFOA&s"
+
+if SHARD_COUNT or os.environ.get("CTFTIMEBOT_SHARDED"):
+    client = commands.AutoShardedBot(
+        command_prefix="!",
+        intents=intents,
+        tree_cls=CommandTree,
+        max_messages=MESSAGE_CACHE_SIZE,
+        shard_count=int(SHARD_COUNT) if SHARD_COUNT else None,
+        shard_ids=[int(shard_id) for shard_id in SHARD_IDS.split(",")] if SHARD_IDS else None,
     )
-    embed.add_field(
-        name="date", value=f"start: {start_time}\nFinish: {finish_time}", inline=False
+else:
+    client = commands.Bot(
+        command_prefix="!", intents=intents, tree_cls=CommandTree, max_messages=MESSAGE_CACHE_SIZE
     )
 
-    duration = info.get("duration", {})
-    days = duration.get("days", 0)
-    hours = duration.get("hours", 0)
+DIGEST_CONCURRENCY = 8
 
-    if days <= 0:
-        embed.add_field(name="duration", value=f"{hours} hour", inline=True)
-    else:
-        embed.add_field(name="duration", value=f"{days} day {hours} hours", inline=True)
+EXTENSIONS = ("cogs.configuration", "cogs.subscribe", "cogs.search")
 
-    embed.add_field(name="Format", value=info["format"], inline=True)
-    embed.add_field(name="onsite", value=info["onsite"], inline=True)
-    embed.add_field(name="weight", value=info["weight"], inline=True)
 
-    if info["restrictions"] == "Individual":
-        embed.add_field(
-            name="restrictions", value=f"{info['restrictions']}", inline=True
-        )
-    else:
-        embed.add_field(
-            name="restrictions",
-            value=f"{info['restrictions']} {info['participants']} team will participate",
-            inline=True,
-        )
+@client.event
+async def on_guild_join(guild):
+    schedule_digest(guild.id)
 
-    embed.set_footer(text=f"CTF ID: {info['id']}")
+    print(f"Joined guild {guild.name} ({guild.id})")
 
-    if info.get("organizers"):
-        embed.set_author(
-            name=info["organizers"][0]["name"],
-            url=info["url"],
-            icon_url=info.get("logo"),
-        )
 
-    return embed
+client.create_ctf_embed = create_ctf_embed
 
 
-client.create_ctf_embed = create_ctf_embed
+DIGEST_CATCH_UP = 6 * 60 * 60
 
+digest_scheduler = DeadlineScheduler()
+warmup_scheduler = DeadlineScheduler()
+pending_digests = {}
 
-@tasks.loop(seconds=60)
-async def check_time_loop():
-    now_str = datetime.now().strftime("%H:%M")
-    config = load_config()
 
-    if not config.get("time") or now_str != config["time"]:
+def schedule_digest(guild_id, catch_up=False):
+    config = config_service.all(guild_id)
+    if not config.get("time"):
+        digest_scheduler.cancel(guild_id)
+        warmup_scheduler.cancel(guild_id)
+        pending_digests.pop(guild_id, None)
         return
 
     now_ts = int(time.time())
-    config_time = config["time"]
-    one_week_later = now_ts + 7 * 24 * 60 * 60
-
-    limit = config.get("limit", 10)
-    response = requests.get(
-        f"https://ctftime.org/api/v1/events/?limit={limit}&start={now_ts}&finish={one_week_later}"
-    )
-    CTFtimedata = response.json()
+    timezone = config.get("timezone", DEFAULT_TIMEZONE)
+    fire_ts = next_fire(config["time"], timezone, now_ts)
 
-    channel_id = config.get("channel_id")
-    channel = client.get_channel(channel_id)
+    # ถ้าบอทดับไปตอนถึงเวลาส่ง ให้ส่งย้อนหลังทันทีหลังเปิดใหม่ (ภายใน DIGEST_CATCH_UP)
+    if catch_up:
+        missed_ts = previous_fire(config["time"], timezone, now_ts)
+        last_fired = storage.get_meta(f"digest_last_fired:{guild_id}")
+        if last_fired is not None and last_fired < missed_ts and now_ts - missed_ts <= DIGEST_CATCH_UP:
+            fire_ts = missed_ts
 
-    if len(config_time) == 4 and config_time[1] == ":":
-        config_time = f"0{config_time}"
-    if now_str != config_time:
-        return
-    if not channel:
-        print(f"Error: Channel with ID {channel_id} not found or inaccessible.")
-        return
+    pending_digests[guild_id] = fire_ts
+    digest_scheduler.schedule(guild_id, fire_ts)
+    warmup_scheduler.schedule(guild_id, fire_ts - DIGEST_WARMUP)
 
-    notify_roles_ids = config.get("notify_roles", [])
 
-    mention_list = []
+def on_config_change(guild_id, changes):
+    # digest ที่เตรียมไว้แล้วอาจใช้ channel/role/limit เก่า ทิ้งไปให้เตรียมใหม่ตอนส่ง
+    digest_builder.discard(guild_id)
+    if "time" in changes or "timezone" in changes:
+        schedule_digest(guild_id)
 
-    guild = client.get_guild(channel.guild.id) if channel and channel.guild else None
-    everyone_role_id = guild.default_role.id if guild else None
 
-    for role_id in notify_roles_ids:
-        if role_id == everyone_role_id:
-            mention_list.append("@everyone")
-        else:
-            mention_list.append(f"<@&{role_id}>")
+async def on_warmup_deadline(guild_id):
+    await client.wait_until_ready()
+    fire_ts = pending_digests.get(guild_id)
+    if fire_ts is None or client.get_guild(guild_id) is None:
+        return
+    await digest_builder.warm(client, guild_id, fire_ts)
 
-    mention_roles_string = " ".join(mention_list)
 
-    mention_message = f"🔔 แจ้งเตือน CTF time\n{mention_roles_string}\n"
+async def on_digest_deadline(guild_id):
+    await client.wait_until_ready()
+    fire_ts = pending_digests.pop(guild_id, None)
+    if fire_ts is None:
+        return
 
-    await channel.send(mention_message)
+    # ส่งไม่สำเร็จ (เช่นไม่มีสิทธิ์ในช่อง) ก็ต้องตั้งเวลาของวันถัดไปเสมอ ไม่งั้น guild นี้จะหยุดได้ digest ไปเลย
+    try:
+        # guild ที่อยู่ shard อื่นหรือบอทออกไปแล้ว ไม่ต้องส่ง
+        if client.get_guild(guild_id) is not None:
+            last_fired = storage.get_meta(f"digest_last_fired:{guild_id}")
+            if last_fired is None or last_fired < fire_ts:
+                storage.set_meta(f"digest_last_fired:{guild_id}", fire_ts)
+                await send_digest(client, guild_id, fire_ts)
+    finally:
+        schedule_digest(guild_id)
 
-    for info in CTFtimedata:
-        if "id" not in info:
-            continue
 
-        embed = create_ctf_embed(info)
-        await channel.send(embed=embed)
+@client.event
+async def on_app_command_completion(interaction, command):
+    observe_command(interaction, "ok")
 
 
 @client.tree.error
 async def on_app_command_error(
     interaction: discord.Interaction, error: app_commands.AppCommandError
 ):
+    observe_command(interaction, "error")
     if isinstance(error, app_commands.CheckFailure):
         error_message = "❌ คุณไม่มีสิทธิ์ใช้งานคำสั่งนี้ (สิทธิ์ถูกจำกัดไว้สำหรับคนที่มี Admin/Manage Guild Perms หรือ Role ผู้ดูแลที่ถูกตั้งค่าไว้)"
         if interaction.response.is_done():
@@ -156,30 +165,137 @@ async def on_app_command_error(
     print(f"App Command Error: {error}")
 
 
+ready_once = False
+
+
 @client.event
 async def on_ready():
+    # on_ready ถูกเรียกซ้ำทุกครั้งที่ต่อ gateway ใหม่ งานตั้งต้นทั้งหมดทำไปแล้วใน main() ก่อน connect
+    global ready_once
+    if ready_once:
+        print(f"Reconnected as {client.user}.")
+        return
+    ready_once = True
     print(f"Logged on as {client.user}!")
 
-    channel = client.get_channel("1366452266873389056")
-    channel.send("Hello my name is :" + Token)
 
-    if not check_time_loop.is_running():
-        check_time_loop.start()
-        print("Time loop started")
+def command_tree_hash():
+    commands_payload = sorted(
+        (command.to_dict(client.tree) for command in client.tree.get_commands()),
+        key=lambda command: command["name"],
+    )
+    return hashlib.sha256(json.dumps(commands_payload, sort_keys=True).encode()).hexdigest()
+
+
+async def clear_legacy_guild_commands():
+    # สมัยบอท guild เดียวคำสั่งถูก sync แบบ guild-scoped ไว้ที่ GUILD_ID ไม่ล้างทิ้งจะเห็นคำสั่งซ้ำสองชุด
+    key = f"legacy_guild_commands_cleared:{client.application_id}"
+    if not GUILD_ID or storage.get_meta(key):
+        return
+
+    guild = discord.Object(id=GUILD_ID)
+    client.tree.clear_commands(guild=guild)
+    try:
+        await client.tree.sync(guild=guild)
+    except discord.Forbidden:
+        # บอทไม่ได้อยู่ใน guild นั้นแล้ว คำสั่งของ guild ก็หายไปพร้อมกัน
+        pass
+    except discord.HTTPException as e:
+        print(f"Error clearing legacy guild commands: {e}")
+        return
+    storage.set_meta(key, GUILD_ID)
+    print(f"Cleared legacy guild commands from guild {GUILD_ID}.")
+
+
+async def sync_commands():
+    # คำสั่งเป็น global ให้ process ที่ถือ shard 0 (หรือไม่ได้แบ่ง shard) sync อยู่ที่เดียว
+    shard_ids = getattr(client, "shard_ids", None)
+    if shard_ids and 0 not in shard_ids:
+        return
+
+    await clear_legacy_guild_commands()
+
+    # sync ช้าและติด rate limit หนัก เรียกเฉพาะตอนคำสั่งเปลี่ยนจากที่ sync ไปล่าสุด
+    key = f"command_tree_hash:{client.application_id}"
+    tree_hash = command_tree_hash()
+    if storage.get_meta(key) == tree_hash:
+        print("Command tree unchanged, skipping sync.")
+        return
 
     try:
-        synced = await client.tree.sync(guild=discord.Object(id=GUILD_ID))
-        print(f"Synced {len(synced)} commands.")
-    except Exception as e:
+        synced = await client.tree.sync()
+    except discord.HTTPException as e:
         print(f"Error syncing commands: {e}")
+        return
+    storage.set_meta(key, tree_hash)
+    print(f"Synced {len(synced)} commands.")
+
+
+def register_metrics():
+    CACHE_REQUESTS.set_function(lambda: ctftime.cache.hits, cache="ctftime", result="hit")
+    CACHE_REQUESTS.set_function(lambda: ctftime.cache.misses, cache="ctftime", result="miss")
+    CACHE_REQUESTS.set_function(lambda: ctftime.cache.revalidated, cache="ctftime", result="revalidated")
+    CACHE_REQUESTS.set_function(lambda: ctftime.stale_served, cache="ctftime", result="stale")
+    CACHE_REQUESTS.set_function(lambda: ctftime.coalesced, cache="ctftime", result="coalesced")
+    CTFTIME_CIRCUIT_OPEN.set_function(lambda: int(ctftime.breaker.state == "open"))
+    CTFTIME_CIRCUIT_TRIPS.set_function(lambda: ctftime.breaker.trips)
+    CACHE_REQUESTS.set_function(lambda: render_cache_info().hits, cache="embeds", result="hit")
+    CACHE_REQUESTS.set_function(lambda: render_cache_info().misses, cache="embeds", result="miss")
+    CACHE_SIZE.set_function(lambda: ctftime.cache_stats()["size"], cache="ctftime")
+    CACHE_SIZE.set_function(lambda: render_cache_info().currsize, cache="embeds")
+    SCHEDULER_BACKLOG.set_function(lambda: len(digest_scheduler), scheduler="digest")
+    SCHEDULER_BACKLOG.set_function(lambda: len(warmup_scheduler), scheduler="digest_warmup")
+    SCHEDULER_BACKLOG.set_function(lambda: dispatcher.stats()["queued"], scheduler="dispatcher")
+    SCHEDULER_BACKLOG.set_function(lambda: dispatcher.stats()["pending_dms"], scheduler="pending_dms")
+    SCHEDULER_BACKLOG.set_function(lambda: subscriptions.dirty, scheduler="subscription_writes")
+    MESSAGES.set_function(lambda: dispatcher.sent, result="sent")
+    MESSAGES.set_function(lambda: dispatcher.failed, result="failed")
+    MESSAGES.set_function(lambda: dispatcher.coalesced, result="coalesced")
+    RATE_LIMITED.set_function(lambda: dispatcher.throttled, scope="dispatcher")
+    metrics_server.set_readiness(lambda: client.is_ready() and not client.is_closed())
 
 
 async def main():
+    storage.migrate_json()
+    storage.adopt_legacy_config(GUILD_ID)
+    storage.prune_messages()
+    event_store.load()
+    for guild_id in config_service.guilds():
+        schedule_digest(guild_id, catch_up=True)
+    config_service.subscribe(on_config_change)
+    register_metrics()
+
     async with client:
-        await client.load_extension("cogs.configuration")
-        await client.load_extension("cogs.subscribe")
-        await client.load_extension("cogs.search")
-        await client.start(Token)
+        # docker stop ส่ง SIGTERM ให้ปิดบอทตามปกติ จะได้ flush ข้อมูลที่ค้างก่อนออก
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(client.close()))
+
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            print(f"Error starting metrics server: {e}")
+        dispatcher.start()
+        sync_worker.start()
+        digest_task = asyncio.create_task(
+            digest_scheduler.run(on_digest_deadline, concurrency=DIGEST_CONCURRENCY)
+        )
+        warmup_task = asyncio.create_task(
+            warmup_scheduler.run(on_warmup_deadline, concurrency=DIGEST_CONCURRENCY)
+        )
+        try:
+            await asyncio.gather(*(client.load_extension(name) for name in EXTENSIONS))
+            await client.login(Token)
+            await sync_commands()
+            await client.connect()
+        finally:
+            digest_task.cancel()
+            warmup_task.cancel()
+            sync_worker.stop()
+            await metrics_server.stop()
+            await dispatcher.stop()
+            await ctftime.close()
+            subscriptions.flush()
+            storage.close()
 
 
 asyncio.run(main())
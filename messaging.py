@@ -0,0 +1,131 @@
+import asyncio
+
+from dispatcher import PRIORITY_DIGEST, dispatcher
+from storage import storage
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARACTERS = 6000
+MAX_CONTENT_CHARACTERS = 2000
+
+NUMBER_EMOJIS = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
+NUMBER_PREFIX_LENGTH = max(len(number) for number in NUMBER_EMOJIS) + 1
+
+
+def chunk_embeds(embeds):
+    """
+    แบ่ง embed เป็นกลุ่มละไม่เกิน 10 อัน และตัวอักษรรวมไม่เกินที่ Discord รับได้ต่อข้อความ
+    """
+    chunk = []
+    size = 0
+    for embed in embeds:
+        # เผื่อหมายเลขที่ number_embeds จะเติมหน้า footer ทีหลัง ไม่งั้นก้อนที่พอดีเป๊ะจะเกินแล้วโดน 400
+        embed_size = len(embed) + NUMBER_PREFIX_LENGTH
+        if chunk and (len(chunk) >= MAX_EMBEDS_PER_MESSAGE or size + embed_size > MAX_EMBED_CHARACTERS):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(embed)
+        size += embed_size
+    if chunk:
+        yield chunk
+
+
+def number_embeds(chunk):
+    # ข้อความที่มีหลาย CTF ให้กด reaction ตามหมายเลขใน footer เพื่อเลือกงาน
+    if len(chunk) > 1:
+        for number, embed in zip(NUMBER_EMOJIS, chunk):
+            embed.set_footer(text=f"{number} {embed.footer.text or ''}".rstrip())
+    return chunk
+
+
+def footer_ctf_id(embed):
+    footer_text = embed.footer.text or ""
+    if "CTF ID: " not in footer_text:
+        return None
+    try:
+        return int(footer_text.split("CTF ID: ")[-1])
+    except ValueError:
+        return None
+
+
+def record_posted(message, embeds, replace=False):
+    entries = []
+    for position, embed in enumerate(embeds):
+        ctf_id = footer_ctf_id(embed)
+        if ctf_id is not None:
+            entries.append((position, ctf_id, embed.title))
+    if message is not None and (entries or replace):
+        storage.record_message(message.id, entries, replace=replace)
+
+
+async def send_embeds(destination, embeds, content=None, priority=PRIORITY_DIGEST):
+    chunks = []
+    pending = []
+    for chunk in chunk_embeds(embeds):
+        chunks.append(chunk)
+        pending.append(dispatcher.send(destination, priority, content=content, embeds=number_embeds(chunk)))
+        content = None
+    if content is not None:
+        pending.append(dispatcher.send(destination, priority, content=content))
+
+    messages = await asyncio.gather(*pending)
+    for message, chunk in zip(messages, chunks):
+        record_posted(message, chunk)
+    return messages
+
+
+def mention_chunks(header, user_ids, limit=MAX_CONTENT_CHARACTERS):
+    """
+    แบ่ง mention ของผู้ใช้เป็นหลายข้อความ แต่ละข้อความไม่เกิน limit ตัวอักษร ข้อความแรกมี header
+    """
+    chunk = header
+    for user_id in user_ids:
+        mention = f"<@{user_id}>"
+        separator = "" if chunk == header or chunk.endswith("\n") else " "
+        if len(chunk) + len(separator) + len(mention) > limit:
+            yield chunk
+            chunk = mention
+        else:
+            chunk += separator + mention
+    if chunk:
+        yield chunk
+
+
+async def send_mentions(destination, header, user_ids, embeds=(), priority=PRIORITY_DIGEST):
+    contents = list(mention_chunks(header, user_ids))
+    messages = await send_embeds(destination, list(embeds), content=contents[0], priority=priority)
+    messages += await asyncio.gather(
+        *(dispatcher.send(destination, priority, content=content) for content in contents[1:])
+    )
+    return messages
+
+
+def stale_notice(store):
+    # ใช้ต่อท้ายข้อความที่ตอบจากสำเนาใน event store ตอน sync กับ CTFtime ไม่สำเร็จมาสักพัก
+    if not store.is_stale():
+        return ""
+    if store.synced_at is None:
+        return "⚠️ ยังดึงข้อมูลจาก CTFtime ไม่ได้ในขณะนี้"
+    return f"⚠️ CTFtime ไม่ตอบสนอง ข้อมูลนี้อัปเดตล่าสุดเมื่อ <t:{int(store.synced_at)}:R>"
+
+
+def is_indexed(message_id):
+    return storage.has_message(message_id)
+
+
+def reaction_target(message_id, emoji):
+    """
+    หา (ctf_id, title) ที่ reaction นี้หมายถึง จาก index ของข้อความที่บอทโพสต์
+    """
+    rows = storage.message_ctfs(message_id)
+    if not rows:
+        return None
+    if len(rows) == 1:
+        return rows[0][1], rows[0][2]
+    emoji = str(emoji)
+    if emoji in NUMBER_EMOJIS:
+        position = NUMBER_EMOJIS.index(emoji)
+        for row_position, ctf_id, title in rows:
+            if row_position == position:
+                return ctf_id, title
+    return None
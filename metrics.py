@@ -0,0 +1,221 @@
+import asyncio
+import math
+import os
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+
+METRICS_HOST = os.environ.get("CTFTIMEBOT_METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.environ.get("CTFTIMEBOT_METRICS_PORT", 8080))
+
+LOOP_LAG_INTERVAL = 1.0
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._functions = {}
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, "")) for name in self.labelnames)
+
+    def set_function(self, function, **labels):
+        # ค่าที่อ่านจากที่อื่นตอนถูก scrape (เช่นขนาดคิว) ไม่ต้องคอย set เอง
+        self._functions[self._key(labels)] = function
+
+    def remove_function(self, **labels):
+        self._functions.pop(self._key(labels), None)
+
+    def samples(self):
+        values = dict(self._values)
+        for key, function in list(self._functions.items()):
+            try:
+                values[key] = function()
+            except Exception as e:
+                print(f"Error collecting metric {self.name}: {e}")
+        for key, value in values.items():
+            yield self.name, key, value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for key, (counts, total, count) in list(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative
+            yield f"{self.name}_sum", key, total
+            yield f"{self.name}_count", key, count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+COMMAND_LATENCY = registry.histogram(
+    "ctftimebot_command_duration_seconds", "Time from interaction to command completion", ("command", "status")
+)
+CTFTIME_LATENCY = registry.histogram(
+    "ctftimebot_ctftime_request_duration_seconds", "CTFtime API request latency per attempt", ("path", "status")
+)
+CTFTIME_ERRORS = registry.counter(
+    "ctftimebot_ctftime_errors_total", "CTFtime API attempts that failed", ("path", "reason")
+)
+CTFTIME_CIRCUIT_OPEN = registry.gauge(
+    "ctftimebot_ctftime_circuit_open", "1 while the CTFtime circuit breaker is failing fast"
+)
+CTFTIME_CIRCUIT_TRIPS = registry.counter(
+    "ctftimebot_ctftime_circuit_trips_total", "Times the CTFtime circuit breaker opened"
+)
+CACHE_REQUESTS = registry.counter(
+    "ctftimebot_cache_requests_total", "Cache lookups by result", ("cache", "result")
+)
+CACHE_SIZE = registry.gauge("ctftimebot_cache_entries", "Entries currently cached", ("cache",))
+LOOP_LAG = registry.histogram(
+    "ctftimebot_event_loop_lag_seconds", "How late the event loop woke a periodic timer",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+SCHEDULER_BACKLOG = registry.gauge(
+    "ctftimebot_scheduler_backlog", "Deadlines or jobs waiting to run", ("scheduler",)
+)
+MESSAGES = registry.counter("ctftimebot_messages_total", "Outbound Discord messages by result", ("result",))
+RATE_LIMITED = registry.counter(
+    "ctftimebot_rate_limited_total", "Sends delayed by a rate limit", ("scope",)
+)
+
+
+class MetricsServer:
+    """
+    HTTP server เล็กๆ บน port 8080 สำหรับ Prometheus (/metrics) และ health/readiness ของ container
+    """
+
+    def __init__(self, registry, host=METRICS_HOST, port=METRICS_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._ready = None
+        self._runner = None
+        self._lag_task = None
+
+    def set_readiness(self, check):
+        self._ready = check
+
+    async def metrics(self, request):
+        return web.Response(body=self.registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    async def health(self, request):
+        # ตอบได้แปลว่า event loop ยังไม่ค้าง
+        return web.Response(text="ok\n")
+
+    async def ready(self, request):
+        if self._ready is not None and not self._ready():
+            return web.Response(status=503, text="not ready\n")
+        return web.Response(text="ready\n")
+
+    async def _measure_loop_lag(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            LOOP_LAG.observe(max(0.0, time.monotonic() - started - LOOP_LAG_INTERVAL))
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_get("/healthz", self.health)
+        app.router.add_get("/readyz", self.ready)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._lag_task = asyncio.create_task(self._measure_loop_lag())
+        print(f"Metrics listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer(registry)
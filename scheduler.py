@@ -0,0 +1,128 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta
+from datetime import time as dt_time
+from zoneinfo import ZoneInfo
+
+MAX_SLEEP = 60 * 60
+
+DEFAULT_TIMEZONE = "Asia/Bangkok"
+
+
+def _local_fire(day, time_str, tz):
+    hour, minute = (int(part) for part in time_str.split(":"))
+    return int(datetime.combine(day, dt_time(hour, minute), tzinfo=tz).timestamp())
+
+
+def next_fire(time_str, tz_name, after_ts):
+    """
+    epoch ของเวลา HH:MM ครั้งถัดไปตาม timezone ที่มากกว่า after_ts
+    """
+    tz = ZoneInfo(tz_name or DEFAULT_TIMEZONE)
+    day = datetime.fromtimestamp(after_ts, tz).date()
+    fire_ts = _local_fire(day, time_str, tz)
+    if fire_ts <= after_ts:
+        fire_ts = _local_fire(day + timedelta(days=1), time_str, tz)
+    return fire_ts
+
+
+def previous_fire(time_str, tz_name, now_ts):
+    """
+    epoch ของเวลา HH:MM ครั้งล่าสุดที่ไม่เกิน now_ts
+    """
+    tz = ZoneInfo(tz_name or DEFAULT_TIMEZONE)
+    day = datetime.fromtimestamp(now_ts, tz).date()
+    fire_ts = _local_fire(day, time_str, tz)
+    if fire_ts > now_ts:
+        fire_ts = _local_fire(day - timedelta(days=1), time_str, tz)
+    return fire_ts
+
+
+class DeadlineScheduler:
+    """
+    Priority queue ของ deadline (epoch seconds) หลับจนถึง deadline ถัดไปแทนการ poll ทุก N วินาที
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, when):
+        seq = next(self._counter)
+        self._entries[key] = (when, seq)
+        heapq.heappush(self._heap, (when, seq, key))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, key):
+        self._entries.pop(key, None)
+
+    def _discard_cancelled(self):
+        while self._heap:
+            when, seq, key = self._heap[0]
+            if self._entries.get(key) == (when, seq):
+                return
+            heapq.heappop(self._heap)
+
+    def next_deadline(self):
+        self._discard_cancelled()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        now = time.time() if now is None else now
+        due = []
+        while True:
+            self._discard_cancelled()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, _, key = heapq.heappop(self._heap)
+            del self._entries[key]
+            due.append(key)
+
+    async def run(self, handler, concurrency=1):
+        semaphore = asyncio.Semaphore(concurrency)
+        running = set()
+
+        async def call(key):
+            try:
+                await handler(key)
+            except Exception as e:
+                print(f"Error handling scheduled deadline {key}: {e}")
+            finally:
+                semaphore.release()
+
+        try:
+            while True:
+                self._wakeup.clear()
+                next_deadline = self.next_deadline()
+
+                if next_deadline is None:
+                    await self._wakeup.wait()
+                    continue
+
+                delay = next_deadline - time.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, MAX_SLEEP))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                for key in self.pop_due():
+                    await semaphore.acquire()
+                    task = asyncio.create_task(call(key))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+        finally:
+            for task in running:
+                task.cancel()
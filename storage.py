@@ -0,0 +1,316 @@
+import json
+import os
+import sqlite3
+import time
+
+from events import Event
+
+DB_PATH = os.environ.get("CTFTIMEBOT_DB", "ctftimebot.db")
+
+NOTIFY_BEFORE = 24 * 60 * 60
+EXPIRE_AFTER_NOTIFIED = 2 * 60 * 60
+POSTED_MESSAGE_RETENTION = 180 * 24 * 60 * 60
+# แถวแทนข้อความของบอทที่ไม่มี CTF (mention ที่ล้น, digest ว่าง) จะได้รู้ว่าเคยดูแล้ว ไม่ต้อง fetch ซ้ำ
+NO_CTFS_POSITION = -1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS config (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS guild_config (
+    guild_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (guild_id, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS events (
+    ctf_id INTEGER PRIMARY KEY,
+    info TEXT NOT NULL,
+    start_ts INTEGER,
+    notify_ts INTEGER,
+    notified INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS events_due ON events (notified, notify_ts);
+
+CREATE TABLE IF NOT EXISTS subscribers (
+    ctf_id INTEGER NOT NULL REFERENCES events (ctf_id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL,
+    guild_id INTEGER,
+    PRIMARY KEY (ctf_id, user_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS posted_messages (
+    message_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    ctf_id INTEGER NOT NULL,
+    title TEXT,
+    posted_at INTEGER NOT NULL,
+    PRIMARY KEY (message_id, position)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS event_snapshot (
+    ctf_id INTEGER PRIMARY KEY,
+    info TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS event_changes (
+    ctf_id INTEGER NOT NULL,
+    changed_at INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    old_value TEXT,
+    new_value TEXT
+);
+
+CREATE INDEX IF NOT EXISTS event_changes_ctf ON event_changes (ctf_id, changed_at);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class Storage:
+    """
+    ที่เก็บข้อมูลของบอทบน SQLite (WAL) แทนการเขียน config.json / subscribe.json ทั้งไฟล์
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commit ไม่ fsync ทุกครั้ง (index ข้อความ/meta เขียนทีละแถวบน event loop) ไฟดับอาจเสีย
+        # commit ท้ายๆ ไปแต่ฐานข้อมูลไม่พัง
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(subscribers)")}
+        if "guild_id" not in columns:
+            self.conn.execute("ALTER TABLE subscribers ADD COLUMN guild_id INTEGER")
+
+    def transaction(self):
+        return _Transaction(self.conn)
+
+    # config
+
+    def get_guild_configs(self):
+        configs = {}
+        for guild_id, key, value in self.conn.execute("SELECT guild_id, key, value FROM guild_config"):
+            configs.setdefault(guild_id, {})[key] = json.loads(value)
+        return configs
+
+    def update_config(self, guild_id, changes, removed=()):
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO guild_config (guild_id, key, value) VALUES (?, ?, ?)",
+                [(guild_id, key, json.dumps(value)) for key, value in changes.items()],
+            )
+            self.conn.executemany(
+                "DELETE FROM guild_config WHERE guild_id = ? AND key = ?",
+                [(guild_id, key) for key in removed],
+            )
+
+    # events / subscribers
+
+    def has_event(self, ctf_id):
+        row = self.conn.execute("SELECT 1 FROM events WHERE ctf_id = ?", (ctf_id,)).fetchone()
+        return row is not None
+
+    def get_event(self, ctf_id):
+        row = self.conn.execute(
+            "SELECT info, notified, start_ts, notify_ts FROM events WHERE ctf_id = ?", (ctf_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "info": Event.from_info(json.loads(row[0])),
+            "notified": bool(row[1]),
+            "start_ts": row[2],
+            "notify_ts": row[3],
+        }
+
+    def add_event(self, ctf_id, info):
+        event = Event.from_info(info)
+        start_ts = event.start_ts
+        notify_ts = start_ts - NOTIFY_BEFORE if start_ts is not None else None
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO events (ctf_id, info, start_ts, notify_ts) VALUES (?, ?, ?, ?)",
+            (ctf_id, json.dumps(event.to_info()), start_ts, notify_ts),
+        )
+        return cursor.rowcount > 0
+
+    def event_ids(self):
+        return [ctf_id for (ctf_id,) in self.conn.execute("SELECT ctf_id FROM events")]
+
+    def update_event(self, ctf_id, info, reset_notified=False):
+        event = Event.from_info(info)
+        start_ts = event.start_ts
+        notify_ts = start_ts - NOTIFY_BEFORE if start_ts is not None else None
+        self.conn.execute(
+            "UPDATE events SET info = ?, start_ts = ?, notify_ts = ?, "
+            "notified = CASE WHEN ? THEN 0 ELSE notified END WHERE ctf_id = ?",
+            (json.dumps(event.to_info()), start_ts, notify_ts, reset_notified, ctf_id),
+        )
+
+    def log_event_change(self, ctf_id, field, old_value, new_value):
+        self.conn.execute(
+            "INSERT INTO event_changes (ctf_id, changed_at, field, old_value, new_value) VALUES (?, ?, ?, ?, ?)",
+            (ctf_id, int(time.time()), field, old_value, new_value),
+        )
+
+    def delete_event(self, ctf_id):
+        self.conn.execute("DELETE FROM events WHERE ctf_id = ?", (ctf_id,))
+
+    def apply_subscriber_changes(self, added, removed):
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO subscribers (ctf_id, user_id, guild_id) VALUES (?, ?, ?)", added
+            )
+            self.conn.executemany("DELETE FROM subscribers WHERE ctf_id = ? AND user_id = ?", removed)
+
+    def all_subscribers(self):
+        return self.conn.execute(
+            "SELECT ctf_id, user_id, guild_id FROM subscribers WHERE guild_id IS NOT NULL"
+        )
+
+    def event_deadlines(self):
+        return self.conn.execute(
+            "SELECT ctf_id, start_ts, notify_ts, notified FROM events ORDER BY notify_ts"
+        ).fetchall()
+
+    def mark_notified(self, ctf_id):
+        self.conn.execute("UPDATE events SET notified = 1 WHERE ctf_id = ?", (ctf_id,))
+
+    # สำเนา CTF ล่าสุดจาก sync worker
+
+    def snapshot_events(self):
+        return [Event.from_info(json.loads(info)) for (info,) in self.conn.execute("SELECT info FROM event_snapshot")]
+
+    def save_snapshot(self, upserted, removed):
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO event_snapshot (ctf_id, info) VALUES (?, ?)",
+                [(event.id, json.dumps(event.to_info())) for event in upserted],
+            )
+            self.conn.executemany(
+                "DELETE FROM event_snapshot WHERE ctf_id = ?", [(ctf_id,) for ctf_id in removed]
+            )
+
+    # message_id -> CTF ของข้อความที่บอทโพสต์
+
+    def record_message(self, message_id, entries, replace=False):
+        posted_at = int(time.time())
+        with self.transaction():
+            # ข้อความที่ถูกแก้ไข (เช่นเปลี่ยนหน้าผลค้นหา) ต้องล้างตำแหน่งเดิมทิ้งก่อน
+            if replace:
+                self.conn.execute("DELETE FROM posted_messages WHERE message_id = ?", (message_id,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO posted_messages (message_id, position, ctf_id, title, posted_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(message_id, position, ctf_id, title, posted_at) for position, ctf_id, title in entries]
+                or [(message_id, NO_CTFS_POSITION, 0, None, posted_at)],
+            )
+
+    def message_ctfs(self, message_id):
+        return self.conn.execute(
+            "SELECT position, ctf_id, title FROM posted_messages WHERE message_id = ? AND position >= 0 "
+            "ORDER BY position",
+            (message_id,),
+        ).fetchall()
+
+    def has_message(self, message_id):
+        row = self.conn.execute("SELECT 1 FROM posted_messages WHERE message_id = ?", (message_id,)).fetchone()
+        return row is not None
+
+    def prune_messages(self, now_ts=None):
+        cutoff = (now_ts or int(time.time())) - POSTED_MESSAGE_RETENTION
+        cursor = self.conn.execute("DELETE FROM posted_messages WHERE posted_at < ?", (cutoff,))
+        return cursor.rowcount
+
+    # meta
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value))
+        )
+
+    # migration
+
+    def migrate_json(self, config_path="config.json", subscribe_path="subscribe.json"):
+        done = self.conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone()
+        if done:
+            return False
+
+        with self.transaction():
+            if os.path.exists(config_path):
+                with open(config_path, "r") as f:
+                    config = json.load(f)
+                if isinstance(config, dict):
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)",
+                        [(key, json.dumps(value)) for key, value in config.items()],
+                    )
+
+            if os.path.exists(subscribe_path):
+                with open(subscribe_path, "r") as f:
+                    subscribe = json.load(f)
+                for ctf_id, event_data in subscribe.get("events", {}).items():
+                    self.add_event(int(ctf_id), event_data["info"])
+                    if event_data.get("notified"):
+                        self.mark_notified(int(ctf_id))
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO subscribers (ctf_id, user_id) VALUES (?, ?)",
+                        [(int(ctf_id), user_id) for user_id in event_data.get("subscribers", [])],
+                    )
+
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+        print(f"Migrated {config_path} / {subscribe_path} into {self.path}")
+        return True
+
+    def adopt_legacy_config(self, guild_id):
+        # config / subscriber สมัยยังเป็นบอท guild เดียว ให้ย้ายไปเป็นของ guild_id
+        if guild_id is None or self.get_meta("legacy_adopted"):
+            return False
+
+        with self.transaction():
+            self.conn.execute(
+                "INSERT OR IGNORE INTO guild_config (guild_id, key, value) SELECT ?, key, value FROM config",
+                (guild_id,),
+            )
+            self.conn.execute("UPDATE subscribers SET guild_id = ? WHERE guild_id IS NULL", (guild_id,))
+            last_fired = self.get_meta("digest_last_fired")
+            if last_fired is not None:
+                self.set_meta(f"digest_last_fired:{guild_id}", last_fired)
+            self.set_meta("legacy_adopted", guild_id)
+        return True
+
+    def close(self):
+        self.conn.close()
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+storage = Storage()
@@ -0,0 +1,100 @@
+import asyncio
+
+from storage import storage
+
+FLUSH_DELAY = 2.0
+
+
+class Subscriptions:
+    """
+    ผู้ติดตามของแต่ละ CTF ในหน่วยความจำ (ctf_id -> {user_id: guild_id}) เช็ค/เพิ่ม/ลบได้ O(1)
+    การเขียนลง storage รวบเป็นก้อนแล้ว commit ทีเดียวทุก FLUSH_DELAY วินาที
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._events = None
+        self._pending = {}
+        self._flush_handle = None
+        self.flushes = 0
+
+    def _loaded(self):
+        if self._events is None:
+            self._events = {}
+            for ctf_id, user_id, guild_id in self._storage.all_subscribers():
+                self._events.setdefault(ctf_id, {})[user_id] = guild_id
+        return self._events
+
+    @property
+    def dirty(self):
+        return len(self._pending)
+
+    def count(self, ctf_id):
+        return len(self._loaded().get(ctf_id, ()))
+
+    def add(self, ctf_id, user_id, guild_id):
+        subscribers = self._loaded().setdefault(ctf_id, {})
+        if user_id in subscribers:
+            return False
+        subscribers[user_id] = guild_id
+        self._mark((ctf_id, user_id), guild_id)
+        return True
+
+    def remove(self, ctf_id, user_id):
+        subscribers = self._loaded().get(ctf_id)
+        if not subscribers or user_id not in subscribers:
+            return False
+        del subscribers[user_id]
+        if not subscribers:
+            del self._events[ctf_id]
+        self._mark((ctf_id, user_id), None)
+        return True
+
+    def drop_event(self, ctf_id):
+        # แถวใน storage ถูกลบตาม event แล้ว (ON DELETE CASCADE) ทิ้งงานที่ค้างของ event นี้ได้เลย
+        self._loaded().pop(ctf_id, None)
+        for key in [key for key in self._pending if key[0] == ctf_id]:
+            del self._pending[key]
+
+    def by_guild(self, ctf_id):
+        guilds = {}
+        for user_id, guild_id in self._loaded().get(ctf_id, {}).items():
+            guilds.setdefault(guild_id, []).append(user_id)
+        return guilds
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._flush_handle = loop.call_later(FLUSH_DELAY, self.flush)
+        return True
+
+    def _mark(self, key, guild_id):
+        self._pending[key] = guild_id
+        if not self._schedule_flush():
+            self.flush()
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        added = [(ctf_id, user_id, guild_id) for (ctf_id, user_id), guild_id in pending.items() if guild_id is not None]
+        removed = [key for key, guild_id in pending.items() if guild_id is None]
+        try:
+            self._storage.apply_subscriber_changes(added, removed)
+            self.flushes += 1
+        except Exception as e:
+            print(f"Error flushing {len(pending)} subscription changes: {e}")
+            pending.update(self._pending)
+            self._pending = pending
+            self._schedule_flush()
+
+
+subscriptions = Subscriptions(storage)
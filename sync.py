@@ -0,0 +1,166 @@
+import asyncio
+import random
+import time
+from bisect import bisect_left, bisect_right
+
+from ctftime import CTFtimeError, CTFtimeUnavailable, ctftime
+from storage import storage
+
+SYNC_INTERVAL = 10 * 60
+SYNC_WINDOW = 90 * 24 * 60 * 60
+SYNC_LIMIT = 300
+STALE_AFTER = 3 * SYNC_INTERVAL
+RETRY_BASE = 15
+ENSURE_TIMEOUT = 15
+
+
+class EventStore:
+    """
+    สำเนา CTF ในช่วงเวลาข้างหน้าที่ sync มาจาก CTFtime ทุกคำสั่ง/loop อ่านจากตรงนี้แทนการเรียก API
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self.events = {}
+        self._order = []
+        self._listeners = []
+        self.synced_at = None
+
+    def __len__(self):
+        return len(self.events)
+
+    def load(self):
+        for event in self._storage.snapshot_events():
+            self.events[event.id] = event
+        self._reindex()
+        self.synced_at = self._storage.get_meta("event_snapshot_synced_at")
+
+    def is_stale(self, now=None):
+        if self.synced_at is None:
+            return True
+        return (now or time.time()) - self.synced_at > STALE_AFTER
+
+    def _reindex(self):
+        self._order = sorted(
+            (event.start_ts, ctf_id) for ctf_id, event in self.events.items() if event.start_ts is not None
+        )
+
+    def get(self, ctf_id):
+        return self.events.get(ctf_id)
+
+    def window(self, start_ts, finish_ts, limit=None):
+        low = bisect_left(self._order, (start_ts, float("-inf")))
+        high = bisect_right(self._order, (finish_ts, float("inf")))
+        ids = self._order[low:high]
+        if limit is not None:
+            ids = ids[:limit]
+        return [self.events[ctf_id] for _, ctf_id in ids]
+
+    def replace(self, events):
+        incoming = {}
+        added = []
+        changed = []
+        for event in events:
+            current = self.events.get(event.id)
+            if current is None:
+                added.append(event)
+            elif current != event:
+                changed.append(event)
+            else:
+                # งานที่ไม่เปลี่ยนใช้ object เดิมต่อ description ฯลฯ จึงมีอยู่ชุดเดียวในหน่วยความจำ
+                event = current
+            incoming[event.id] = event
+        removed = [ctf_id for ctf_id in self.events if ctf_id not in incoming]
+
+        self.events = incoming
+        self._reindex()
+        self.synced_at = time.time()
+
+        if added or changed or removed:
+            self._publish(added, changed, removed)
+        return added, changed, removed
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _publish(self, added, changed, removed):
+        for callback in list(self._listeners):
+            try:
+                callback(added, changed, removed)
+            except Exception as e:
+                print(f"Error in event store listener {callback!r}: {e}")
+
+
+class SyncWorker:
+    def __init__(self, store, interval=SYNC_INTERVAL, window=SYNC_WINDOW, limit=SYNC_LIMIT):
+        self.store = store
+        self.interval = interval
+        self.window = window
+        self.limit = limit
+        self.failures = 0
+        self._task = None
+        self._lock = asyncio.Lock()
+
+    async def sync_once(self):
+        async with self._lock:
+            now_ts = int(time.time())
+            events = await ctftime.get_events(now_ts, now_ts + self.window, limit=self.limit)
+            # ช่วง SYNC_WINDOW ข้างหน้าไม่มีทางว่างจริง ได้ list ว่างแปลว่าข้อมูลเพี้ยน อย่าลบสำเนาที่มีทิ้ง
+            if not events and self.store.events:
+                raise CTFtimeError("CTFtime returned no events, keeping the previous snapshot")
+            added, changed, removed = self.store.replace(events)
+            storage.save_snapshot(added + changed, removed)
+            storage.set_meta("event_snapshot_synced_at", self.store.synced_at)
+
+        if added or changed or removed:
+            print(f"CTFtime sync: {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+        return added, changed, removed
+
+    async def ensure_synced(self):
+        # ยังไม่มีข้อมูลเลย (เปิดบอทครั้งแรก) ให้ sync ทันทีหนึ่งครั้ง แต่ไม่ให้ผู้ใช้รอนานเกิน ENSURE_TIMEOUT
+        if self.store.synced_at is None and not self.store.events:
+            try:
+                await asyncio.wait_for(asyncio.shield(self.sync_once()), ENSURE_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise CTFtimeUnavailable(f"CTFtime did not answer within {ENSURE_TIMEOUT}s") from None
+
+    def retry_delay(self, error):
+        # ล้มติดกันให้ถอยห่างขึ้นเรื่อยๆ (สุ่มกระจายไม่ให้ทุก process ยิงพร้อมกัน) และไม่ลองก่อน breaker เปิดให้
+        delay = min(self.interval, RETRY_BASE * 2 ** (self.failures - 1)) * random.uniform(0.5, 1.5)
+        if isinstance(error, CTFtimeUnavailable):
+            delay = max(delay, ctftime.breaker.remaining())
+        return delay
+
+    async def run(self):
+        while True:
+            try:
+                await self.sync_once()
+                self.failures = 0
+                delay = self.interval
+            except CTFtimeError as e:
+                self.failures += 1
+                delay = self.retry_delay(e)
+                print(f"CTFtime sync failed ({self.failures} in a row), retrying in {delay:.0f}s: {e}")
+            except Exception as e:
+                # bug หรือข้อมูลแปลกๆ ต้องไม่ทำให้ sync หยุดไปทั้ง process
+                self.failures += 1
+                delay = self.retry_delay(e)
+                print(f"Unexpected error in CTFtime sync, retrying in {delay:.0f}s: {e!r}")
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+event_store = EventStore(storage)
+sync_worker = SyncWorker(event_store)